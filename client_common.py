@@ -0,0 +1,89 @@
+"""
+Process-wide AWS and HTTP clients shared by the example clients.
+Both are created lazily on first use and reused by every caller in the process.
+"""
+
+import atexit
+import logging
+import threading
+
+import boto3
+import requests
+from botocore.config import Config
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+log = logging.getLogger(__name__)
+
+
+class _LoggingRetry(Retry):
+    """Retry policy that logs each failed attempt by number before it is retried."""
+    
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        # Raises MaxRetryError once retries are exhausted; the caller reports that failure
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        cause = error if error is not None else f"HTTP {response.status}"
+        log.warning("🔁 Attempt %d of %s %s failed (%s); retrying", len(retry.history), method, url, cause)
+        return retry
+
+
+# Transient failures are retried with jittered exponential backoff: connection errors for
+# any method, gateway statuses for GET only. /register-traces mints a new job on every
+# call, so a POST that may have reached the service (read timeout, 5xx from a proxy) is
+# never re-sent. Other 4xx/5xx responses are returned to the caller as-is.
+HTTP_RETRY = _LoggingRetry(
+    total=3,
+    read=0,
+    backoff_factor=0.5,
+    backoff_max=30,
+    backoff_jitter=0.25,
+    status_forcelist=(502, 503, 504),
+    allowed_methods=frozenset(["GET"]),
+    raise_on_status=False
+)
+
+# Bedrock client shared by all invocations in this process (boto3 clients are thread-safe)
+_BEDROCK_CLIENT = None
+_bedrock_client_lock = threading.Lock()
+
+# HTTP session shared by all callers that are not given their own
+_DEFAULT_SESSION = None
+_session_lock = threading.Lock()
+
+
+def get_bedrock_client():
+    """Return the process-wide bedrock-agent-runtime client, creating it on first use."""
+    global _BEDROCK_CLIENT
+    if _BEDROCK_CLIENT is None:
+        with _bedrock_client_lock:
+            if _BEDROCK_CLIENT is None:
+                _BEDROCK_CLIENT = boto3.client(
+                    'bedrock-agent-runtime',
+                    config=Config(
+                        max_pool_connections=50,
+                        retries={"max_attempts": 5, "mode": "adaptive"}
+                    )
+                )
+    return _BEDROCK_CLIENT
+
+
+def get_default_session() -> requests.Session:
+    """Return the process-wide pooled session, creating it on first use."""
+    global _DEFAULT_SESSION
+    if _DEFAULT_SESSION is None:
+        with _session_lock:
+            if _DEFAULT_SESSION is None:
+                session = requests.Session()
+
+                # Pooled keep-alive connections with transport-level retries (see HTTP_RETRY)
+                adapter = HTTPAdapter(pool_connections=20, pool_maxsize=100, max_retries=HTTP_RETRY)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers.update({
+                    "Content-Type": "application/json",
+                    "Accept": "application/json",
+                    "Connection": "keep-alive"
+                })
+                atexit.register(session.close)
+                _DEFAULT_SESSION = session
+    return _DEFAULT_SESSION
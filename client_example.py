@@ -3,18 +3,59 @@ Example client that sends traces to the Langfuse Observability Service.
 This shows how to extract traces from Bedrock Agent responses and send them to the service.
 """
 
+import gzip
 import json
-import boto3
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+import msgspec
+import orjson
 import requests
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Set
+
+from client_common import get_bedrock_client, get_default_session
+from schemas import AgentFields, InvokeParams, SessionContext, TraceFields
+
+log = logging.getLogger(__name__)
+
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+# Request bodies larger than this are gzip-compressed before sending
+GZIP_MIN_BYTES = 4096
+
+# Log message templates for the per-call path; arguments are formatted only when emitted
+_MSG_INVOKE = "🚀 Invoking agent %s with input: %s"
+_MSG_EXTRACTED = "📊 Extracted %d traces from agent response"
+_MSG_INVOKE_FAILED = "❌ Error during agent invocation: %s"
+_MSG_SENDING = "📤 Sending %d traces to observability service..."
+_MSG_SENT = "✅ Traces sent successfully: %s"
+_MSG_SEND_FAILED = "❌ Failed to send traces to service: %s"
+
+# Module-level encoders avoid re-creating encoder state per request
+_JSON_ENCODER = msgspec.json.Encoder()
+_MSGPACK_ENCODER = msgspec.msgpack.Encoder()
+
+# Background trace submissions from every client instance run on this shared pool
+_SUBMIT_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="observability")
+
 
 class LangfuseObservabilityClient:
     """Client for sending traces to the Langfuse Observability Service."""
     
-    def __init__(self, service_url: str = "http://localhost:8000"):
+    def __init__(
+        self,
+        service_url: str = "http://localhost:8000",
+        use_msgpack: bool = False,
+        session: Optional[requests.Session] = None
+    ):
         self.service_url = service_url.rstrip("/")
-        self.session = requests.Session()
+        # Shared pooled session unless the caller supplies one, so short-lived clients keep alive
+        self.session = session or get_default_session()
+        # Send /register-traces bodies as msgpack instead of JSON
+        self.use_msgpack = use_msgpack
+        # Pre-encoded agent fields, keyed by agent configuration
+        self._session_contexts: Dict[tuple, SessionContext] = {}
+        # Background submissions still in flight, so close() can wait for them
+        self._pending: Set[Future] = set()
     
     def invoke_agent_with_observability(
         self,
@@ -25,7 +66,8 @@ class LangfuseObservabilityClient:
         user_id: str = "anonymous",
         model_id: str = None,
         tags: List[str] = None,
-        streaming: bool = False
+        streaming: bool = False,
+        background: bool = False
     ) -> Dict[str, Any]:
         """
         Invoke Bedrock Agent and send traces to Langfuse Observability Service.
@@ -41,25 +83,47 @@ class LangfuseObservabilityClient:
             model_id: Model ID used by the agent
             tags: Tags for filtering in Langfuse
             streaming: Whether to use streaming mode
+            background: Submit the traces on a background thread instead of
+                waiting for the service
         
         Returns:
-            Dictionary with agent response and observability status
+            Dictionary with agent response and the service response under
+            "observability"; with background=True, an "observability_future"
+            instead (see wait_observability)
+        """
+        return self.invoke(InvokeParams(
+            input_text=input_text,
+            agent_id=agent_id,
+            agent_alias_id=agent_alias_id,
+            session_id=session_id,
+            user_id=user_id,
+            model_id=model_id,
+            tags=tuple(tags) if tags else (),
+            streaming=streaming
+        ), background=background)
+    
+    def invoke(self, params: InvokeParams, background: bool = False) -> Dict[str, Any]:
         """
-        tags = tags or []
+        Invoke Bedrock Agent with pre-built parameters (see invoke_agent_with_observability).
         
-        # Create Bedrock client
-        bedrock_client = boto3.client('bedrock-agent-runtime')
+        Returns:
+            Dictionary with agent response and the service response under
+            "observability"; with background=True, an "observability_future"
+            instead (see wait_observability)
+        """
+        # Reuse the cached Bedrock client
+        bedrock_client = get_bedrock_client()
         
         # Prepare invocation parameters
         invoke_params = {
-            "inputText": input_text,
-            "agentId": agent_id,
-            "agentAliasId": agent_alias_id,
-            "sessionId": session_id,
+            "inputText": params.input_text,
+            "agentId": params.agent_id,
+            "agentAliasId": params.agent_alias_id,
+            "sessionId": params.session_id,
             "enableTrace": True  # Required to get trace data
         }
         
-        if streaming:
+        if params.streaming:
             invoke_params["streamingConfigurations"] = {
                 "applyGuardrailInterval": 10,
                 "streamFinalResponse": True
@@ -67,61 +131,107 @@ class LangfuseObservabilityClient:
         
         try:
             # Invoke the Bedrock Agent
-            print(f"🚀 Invoking agent {agent_id} with input: {input_text}")
+            log.info(_MSG_INVOKE, params.agent_id, params.input_text)
             response = bedrock_client.invoke_agent(**invoke_params)
             
             # Extract traces and completion from response
             traces = []
-            completion_text = ""
+            parts = []
+            # Encode each trace event as it arrives so the raw events are not retained
+            encode_trace = _MSGPACK_ENCODER.encode if self.use_msgpack else _JSON_ENCODER.encode
             
-            for event in response['completion']:
-                # Collect text chunks
-                if 'chunk' in event:
-                    chunk_data = event['chunk']
-                    if 'bytes' in chunk_data:
-                        text = chunk_data['bytes'].decode('utf-8') if isinstance(chunk_data['bytes'], bytes) else str(chunk_data['bytes'])
-                        completion_text += text
+            if not params.streaming:
+                # Non-streaming responses are a handful of events; drain them with comprehensions
+                events = list(response['completion'])
+                traces = [msgspec.Raw(encode_trace(e['trace'])) for e in events if 'trace' in e]
+                parts = [e['chunk']['bytes'] for e in events if 'chunk' in e and 'bytes' in e['chunk']]
+            else:
+                for event in response['completion']:
+                    # Collect raw text chunks; decoded once after the stream ends
+                    if (chunk_data := event.get('chunk')):
+                        if (chunk_bytes := chunk_data.get('bytes')) is not None:
+                            parts.append(chunk_bytes)
                 
-                # Collect trace events
-                elif 'trace' in event:
-                    traces.append(event['trace'])
+                    # Collect trace events
+                    elif (trace := event.get('trace')):
+                        traces.append(msgspec.Raw(encode_trace(trace)))
             
-            print(f"📊 Extracted {len(traces)} traces from agent response")
+            try:
+                completion_text = b"".join(parts).decode()
+            except TypeError:
+                # Bedrock sends bytes; only fall back per chunk if something else slipped in
+                completion_text = "".join(
+                    p.decode() if isinstance(p, (bytes, bytearray)) else str(p) for p in parts
+                )
             
-            # Send traces to observability service
-            observability_result = self.send_traces_to_service(
-                agent_data={
-                    "input_text": input_text,
-                    "output_text": completion_text,
-                    "agent_id": agent_id,
-                    "agent_alias_id": agent_alias_id,
-                    "session_id": session_id,
-                    "user_id": user_id,
-                    "model_id": model_id,
-                    "tags": tags
-                },
+            log.info(_MSG_EXTRACTED, len(traces))
+            
+            context = self._session_context(
+                params.agent_id, params.agent_alias_id, params.user_id, params.model_id, params.tags
+            )
+            fields = TraceFields(
+                input_text=params.input_text,
+                output_text=completion_text,
+                session_id=params.session_id,
                 traces=traces,
-                streaming=streaming
+                streaming=params.streaming
             )
-            
-            return {
+            result = {
                 "completion": completion_text,
                 "traces_count": len(traces),
-                "observability": observability_result,
                 "status": "success"
             }
             
+            # Send traces to observability service
+            if background:
+                future = _SUBMIT_POOL.submit(self._send_fields, context, fields)
+                self._pending.add(future)
+                future.add_done_callback(self._pending.discard)
+                result["observability_future"] = future
+            else:
+                result["observability"] = self._send_fields(context, fields)
+            
+            return result
+            
         except Exception as e:
-            print(f"❌ Error during agent invocation: {str(e)}")
+            log.error(_MSG_INVOKE_FAILED, e)
             return {
                 "error": str(e),
                 "status": "error"
             }
     
+    def wait_observability(self, result: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Wait for a background trace submission started with background=True.
+        
+        The service response is also stored in result["observability"]; for
+        results of a foreground call it is returned as is.
+        
+        Args:
+            result: Dictionary returned by invoke_agent_with_observability
+            timeout: Maximum seconds to wait (None waits indefinitely)
+        
+        Returns:
+            Response from the observability service
+        """
+        future = result.pop("observability_future", None)
+        if future is not None:
+            result["observability"] = future.result(timeout=timeout)
+        return result.get("observability", {})
+    
+    def close(self) -> None:
+        """
+        Wait for this client's pending background trace submissions.
+        
+        The submission pool and HTTP session are shared (or owned by the
+        caller) and stay open.
+        """
+        wait(list(self._pending))
+    
     def send_traces_to_service(
         self,
         agent_data: Dict[str, Any],
-        traces: List[Dict[str, Any]],
+        traces: List[Any],
         streaming: bool = False,
         trace_id: str = None
     ) -> Dict[str, Any]:
@@ -130,59 +240,114 @@ class LangfuseObservabilityClient:
         
         Args:
             agent_data: Original agent invocation data
-            traces: List of trace events from Bedrock Agent
+            traces: Trace events from Bedrock Agent, as dicts or pre-encoded msgspec.Raw
             streaming: Whether streaming mode was used
             trace_id: Optional custom trace ID
         
         Returns:
             Response from the observability service
         """
-        payload = {
+        # Agent fields are encoded once per configuration; only per-call fields are encoded here
+        context = self._session_context(
+            agent_id=agent_data["agent_id"],
+            agent_alias_id=agent_data["agent_alias_id"],
+            user_id=agent_data.get("user_id", "anonymous"),
+            model_id=agent_data.get("model_id"),
+            tags=agent_data.get("tags")
+        )
+        fields = TraceFields(
             # Input/Output data
-            "input_text": agent_data["input_text"],
-            "output_text": agent_data.get("output_text", ""),
-            "agent_id": agent_data["agent_id"],
-            "agent_alias_id": agent_data["agent_alias_id"],
-            "session_id": agent_data["session_id"],
-            "user_id": agent_data.get("user_id", "anonymous"),
-            "model_id": agent_data.get("model_id"),
-            "tags": agent_data.get("tags", []),
+            input_text=agent_data["input_text"],
+            output_text=agent_data.get("output_text", ""),
+            session_id=agent_data["session_id"],
             
             # Trace data
-            "traces": traces,
+            traces=traces,
             
             # Optional metadata
-            "streaming": streaming
-        }
-        
-        if trace_id:
-            payload["trace_id"] = trace_id
+            streaming=streaming,
+            trace_id=trace_id
+        )
+        return self._send_fields(context, fields)
+    
+    def _send_fields(self, context: SessionContext, fields: TraceFields) -> Dict[str, Any]:
+        """Encode a payload from its session and per-call fields and send it to the service."""
+        payload = msgspec.Raw(context.encode(fields, msgpack=self.use_msgpack))
         
         try:
-            print(f"📤 Sending {len(traces)} traces to observability service...")
+            log.info(_MSG_SENDING, len(fields.traces))
             
-            response = self.session.post(
-                f"{self.service_url}/register-traces",
-                json=payload,
-                headers={"Content-Type": "application/json"},
-                timeout=30
-            )
+            response = self._post_payload(f"{self.service_url}/register-traces", payload)
             
             response.raise_for_status()
-            result = response.json()
+            result = self._decode_response(response)
             
-            print(f"✅ Traces sent successfully: {result['message']}")
+            log.info(_MSG_SENT, result.get("message"))
             return result
             
         except requests.exceptions.RequestException as e:
-            print(f"❌ Failed to send traces to service: {str(e)}")
+            log.error(_MSG_SEND_FAILED, e)
             return {
                 "error": str(e),
                 "status": "failed"
             }
+    
+    def _session_context(
+        self,
+        agent_id: str,
+        agent_alias_id: str,
+        user_id: str = "anonymous",
+        model_id: str = None,
+        tags: List[str] = None
+    ) -> SessionContext:
+        """Return the cached pre-encoded agent fields for this configuration."""
+        key = (agent_id, agent_alias_id, user_id, model_id, tuple(tags) if tags else ())
+        context = self._session_contexts.get(key)
+        if context is None:
+            context = SessionContext.from_fields(AgentFields(
+                agent_id=agent_id,
+                agent_alias_id=agent_alias_id,
+                user_id=user_id,
+                model_id=model_id,
+                tags=list(key[4])
+            ))
+            self._session_contexts[key] = context
+        return context
+    
+    def _post_payload(self, url: str, payload: Any) -> requests.Response:
+        """
+        Encode and POST a payload, bypassing requests' stdlib json encoding.
+        
+        The body is msgpack when enabled on the client, otherwise JSON; large
+        bodies are gzip-compressed. msgspec.Raw payloads are sent verbatim and
+        must already be in that format.
+        """
+        if self.use_msgpack:
+            headers = {"Content-Type": MSGPACK_CONTENT_TYPE, "Accept": MSGPACK_CONTENT_TYPE}
+            body = _MSGPACK_ENCODER.encode(payload)
+        else:
+            headers = {"Content-Type": "application/json"}
+            body = _JSON_ENCODER.encode(payload)
+        
+        body = self._compress(body, headers)
+        return self.session.post(url, data=body, headers=headers, timeout=30)
+    
+    def _compress(self, body: bytes, headers: Dict[str, str]) -> bytes:
+        """Gzip large request bodies, adding the Content-Encoding header when applied."""
+        if len(body) < GZIP_MIN_BYTES:
+            return body
+        headers["Content-Encoding"] = "gzip"
+        return gzip.compress(body, compresslevel=1)
+    
+    def _decode_response(self, response: requests.Response) -> Dict[str, Any]:
+        """Decode a service response: msgpack if the service negotiated it, otherwise JSON."""
+        if response.headers.get("Content-Type", "").startswith(MSGPACK_CONTENT_TYPE):
+            return msgspec.msgpack.decode(response.content)
+        return orjson.loads(response.content)
 
 def main():
     """Example usage of the Langfuse Observability Client."""
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     
     # Agent configuration
     agent_config = {
@@ -207,9 +372,12 @@ def main():
     if result["status"] == "success":
         print(f"\n🤖 Agent Response: {result['completion']}")
         print(f"📊 Processed {result['traces_count']} traces")
-        print(f"🔗 Observability Status: {result['observability']['status']}")
+        observability = client.wait_observability(result)
+        print(f"🔗 Observability Status: {observability.get('status')}")
     else:
         print(f"\n❌ Error: {result['error']}")
+    
+    client.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
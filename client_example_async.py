@@ -3,20 +3,201 @@ Async client example for the new Celery-based Langfuse Observability Service.
 This shows how to work with the job-based async API.
 """
 
+import asyncio
+import gzip
 import json
-import boto3
+import logging
+import threading
+import msgspec
+import orjson
 import requests
 import time
+from concurrent.futures import Future, wait
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set, Tuple
+
+try:
+    import httpx
+except ImportError:  # optional: HTTP/2 multiplexing for job-status polls
+    httpx = None
+
+from client_common import get_bedrock_client, get_default_session
+from schemas import AgentFields, InvokeParams, SessionContext, TraceFields
+
+log = logging.getLogger(__name__)
+
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+# Request bodies larger than this are gzip-compressed before sending
+GZIP_MIN_BYTES = 4096
+
+# Log message templates for the per-call path; arguments are formatted only when emitted
+_MSG_INVOKE = "🚀 Invoking agent %s with input: %s"
+_MSG_AGENT_DONE = "📊 Agent completed in %.2fs. Extracted %d traces"
+_MSG_INVOKE_FAILED = "❌ Error during agent invocation: %s"
+_MSG_SUBMITTING = "📤 Submitting %d traces for async processing..."
+_MSG_QUEUED = "✅ Job queued successfully: %s"
+_MSG_SUBMIT_FAILED = "❌ Failed to submit traces: %s"
+_MSG_BATCH_SUBMITTING = "📤 Submitting batch of %d trace jobs..."
+_MSG_BATCH_QUEUED = "✅ Batch queued successfully: %d jobs"
+_MSG_BATCH_FAILED = "❌ Failed to submit trace batch: %s"
+_MSG_RESPONSE = "   Response: %s"
+
+# Module-level encoders avoid re-creating encoder state per request
+_JSON_ENCODER = msgspec.json.Encoder()
+_MSGPACK_ENCODER = msgspec.msgpack.Encoder()
+
+# Transport errors raised by either HTTP backend
+_HTTP_ERRORS = (requests.exceptions.RequestException,) + ((httpx.HTTPError,) if httpx else ())
+
+
+class BatchingBuffer:
+    """
+    Accumulates trace payloads and submits them in a single batch request.
+    
+    A batch is sent once it reaches max_batch_bytes, or max_batch_latency_ms
+    after its first payload was buffered (from a timer thread if no further
+    payload arrives), or when flush() is called. Each payload gets a future
+    that resolves to its own entry of the batch response.
+    """
+    
+    def __init__(
+        self,
+        client: "AsyncLangfuseObservabilityClient",
+        max_batch_bytes: int = 512 * 1024,
+        max_batch_latency_ms: int = 500
+    ):
+        self.client = client
+        self.max_batch_bytes = max_batch_bytes
+        self.max_batch_latency_ms = max_batch_latency_ms
+        self._batch: List[Tuple[msgspec.Raw, Future]] = []
+        self._size = 0
+        self._oldest = None
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        # Futures of payloads not yet answered, including batches being sent
+        self._pending: Set[Future] = set()
+    
+    def add(self, body: bytes) -> Future:
+        """
+        Buffer a JSON-encoded payload, flushing when the batch is full or too old.
+        
+        Returns:
+            Future resolving to this payload's job entry ({"job_id", "status",
+            "message"}), or to {"error", "status": "failed"} if the batch
+            request failed
+        """
+        future = Future()
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        
+        with self._lock:
+            # The raw JSON is embedded verbatim in the batch body
+            self._batch.append((msgspec.Raw(body), future))
+            self._size += len(body)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+                # Send this batch on time even if no further payload arrives
+                self._timer = threading.Timer(self.max_batch_latency_ms / 1000, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+            
+            age_ms = (time.monotonic() - self._oldest) * 1000
+            if self._size < self.max_batch_bytes and age_ms < self.max_batch_latency_ms:
+                return future
+            batch = self._take()
+        self._send(batch)
+        return future
+    
+    def flush(self) -> None:
+        """Submit all buffered payloads now."""
+        with self._lock:
+            if not self._batch:
+                return
+            batch = self._take()
+        self._send(batch)
+    
+    def close(self) -> None:
+        """Send any buffered payloads and wait until every batch has been answered."""
+        self.flush()
+        wait(list(self._pending))
+    
+    def _take(self) -> List[Tuple[msgspec.Raw, Future]]:
+        """Empty the buffer and return its payloads; the caller holds the lock."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch = self._batch
+        self._batch = []
+        self._size = 0
+        self._oldest = None
+        return batch
+    
+    def _send(self, batch: List[Tuple[msgspec.Raw, Future]]) -> None:
+        """Submit one batch and resolve each payload's future from the response."""
+        try:
+            result = self.client.submit_traces_batch([body for body, _ in batch])
+            jobs = result.get("jobs")
+            if jobs is None:
+                # The request failed (already logged); every payload shares the error
+                for _, future in batch:
+                    future.set_result(result)
+                return
+            if len(jobs) != len(batch):
+                raise ValueError(f"Expected {len(batch)} job entries, got {len(jobs)}")
+            
+            for (_, future), job in zip(batch, jobs):
+                future.set_result(job)
+        
+        except Exception as e:
+            # Anything else (bad response body, encoding error) must not kill the
+            # timer thread or leave callers waiting on their futures
+            log.error(_MSG_BATCH_FAILED, e)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
 
 
 class AsyncLangfuseObservabilityClient:
     """Async client for the Langfuse Observability Service."""
     
-    def __init__(self, service_url: str = "http://localhost:8000"):
+    def __init__(
+        self,
+        service_url: str = "http://localhost:8000",
+        use_msgpack: bool = False,
+        long_poll: bool = False,
+        session: Optional[requests.Session] = None
+    ):
         self.service_url = service_url.rstrip("/")
-        self.session = requests.Session()
+        # Shared pooled session unless the caller supplies one, so short-lived clients keep alive
+        self.session = session or get_default_session()
+        # HTTP/2 client multiplexing all requests over one connection, when httpx[http2] is
+        # installed. HTTP/2 is only negotiated over TLS, so plain http:// services keep using
+        # the requests session and its retry policy.
+        self.http = None
+        if httpx is not None and self.service_url.startswith("https://"):
+            try:
+                self.http = httpx.Client(
+                    # Connection failures are retried, like the session's adapter; a request
+                    # that reached the service is not re-sent
+                    transport=httpx.HTTPTransport(
+                        http2=True,
+                        limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+                        retries=3
+                    ),
+                    timeout=10.0,
+                    headers={"Accept": "application/json"}
+                )
+            except ImportError:
+                # httpx is installed without the h2 package; keep using the requests session
+                pass
+        # Send /register-traces bodies as msgpack instead of JSON
+        self.use_msgpack = use_msgpack
+        # Pre-encoded agent fields, keyed by agent configuration
+        self._session_contexts: Dict[tuple, SessionContext] = {}
+        # Ask the service to hold status requests open until the job finishes (requires ?wait support)
+        self.long_poll = long_poll
+        # Buffer used by invoke_agent_with_observability(batch=True)
+        self.batch_buffer = BatchingBuffer(self)
     
     def invoke_agent_with_observability(
         self,
@@ -30,7 +211,8 @@ class AsyncLangfuseObservabilityClient:
         streaming: bool = False,
         wait_for_completion: bool = True,
         poll_interval: int = 2,
-        max_wait_time: int = 300
+        max_wait_time: int = 300,
+        batch: bool = False
     ) -> Dict[str, Any]:
         """
         Invoke Bedrock Agent and register traces asynchronously.
@@ -45,27 +227,61 @@ class AsyncLangfuseObservabilityClient:
             tags: Tags for filtering in Langfuse
             streaming: Whether to use streaming mode
             wait_for_completion: Whether to wait for job completion
-            poll_interval: Seconds between status checks
+            poll_interval: Seconds to pause between waits when the service
+                sends no Retry-After
             max_wait_time: Maximum seconds to wait for completion
+            batch: Queue the traces in the client's batch buffer instead of
+                submitting them immediately (sent when the batch fills or ages
+                out, on batch_buffer.flush(), or on close()); the result then
+                holds a "job_future" resolving to this call's job entry
         
         Returns:
             Dictionary with agent response and job information
         """
-        tags = tags or []
+        return self.invoke(
+            InvokeParams(
+                input_text=input_text,
+                agent_id=agent_id,
+                agent_alias_id=agent_alias_id,
+                session_id=session_id,
+                user_id=user_id,
+                model_id=model_id,
+                tags=tuple(tags) if tags else (),
+                streaming=streaming
+            ),
+            wait_for_completion=wait_for_completion,
+            poll_interval=poll_interval,
+            max_wait_time=max_wait_time,
+            batch=batch
+        )
+    
+    def invoke(
+        self,
+        params: InvokeParams,
+        wait_for_completion: bool = True,
+        poll_interval: int = 2,
+        max_wait_time: int = 300,
+        batch: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Invoke Bedrock Agent with pre-built parameters (see invoke_agent_with_observability).
         
-        # Create Bedrock client
-        bedrock_client = boto3.client('bedrock-agent-runtime')
+        Returns:
+            Dictionary with agent response and job information
+        """
+        # Reuse the cached Bedrock client
+        bedrock_client = get_bedrock_client()
         
         # Prepare invocation parameters
         invoke_params = {
-            "inputText": input_text,
-            "agentId": agent_id,
-            "agentAliasId": agent_alias_id,
-            "sessionId": session_id,
+            "inputText": params.input_text,
+            "agentId": params.agent_id,
+            "agentAliasId": params.agent_alias_id,
+            "sessionId": params.session_id,
             "enableTrace": True  # Required to get trace data
         }
         
-        if streaming:
+        if params.streaming:
             invoke_params["streamingConfigurations"] = {
                 "applyGuardrailInterval": 10,
                 "streamFinalResponse": True
@@ -73,44 +289,70 @@ class AsyncLangfuseObservabilityClient:
         
         try:
             # Invoke the Bedrock Agent
-            print(f"🚀 Invoking agent {agent_id} with input: {input_text}")
+            log.info(_MSG_INVOKE, params.agent_id, params.input_text)
             start_time = time.time()
             response = bedrock_client.invoke_agent(**invoke_params)
             
             # Extract traces and completion from response
             traces = []
-            completion_text = ""
-            
-            for event in response['completion']:
-                # Collect text chunks
-                if 'chunk' in event:
-                    chunk_data = event['chunk']
-                    if 'bytes' in chunk_data:
-                        text = chunk_data['bytes'].decode('utf-8') if isinstance(chunk_data['bytes'], bytes) else str(chunk_data['bytes'])
-                        completion_text += text
+            parts = []
+            # Encode each trace event as it arrives so the raw events are not retained
+            # (batches are always sent as JSON)
+            encode_trace = _MSGPACK_ENCODER.encode if self.use_msgpack and not batch else _JSON_ENCODER.encode
+            
+            if not params.streaming:
+                # Non-streaming responses are a handful of events; drain them with comprehensions
+                events = list(response['completion'])
+                traces = [msgspec.Raw(encode_trace(e['trace'])) for e in events if 'trace' in e]
+                parts = [e['chunk']['bytes'] for e in events if 'chunk' in e and 'bytes' in e['chunk']]
+            else:
+                for event in response['completion']:
+                    # Collect raw text chunks; decoded once after the stream ends
+                    if (chunk_data := event.get('chunk')):
+                        if (chunk_bytes := chunk_data.get('bytes')) is not None:
+                            parts.append(chunk_bytes)
                 
-                # Collect trace events
-                elif 'trace' in event:
-                    traces.append(event['trace'])
+                    # Collect trace events
+                    elif (trace := event.get('trace')):
+                        traces.append(msgspec.Raw(encode_trace(trace)))
+            
+            try:
+                completion_text = b"".join(parts).decode()
+            except TypeError:
+                # Bedrock sends bytes; only fall back per chunk if something else slipped in
+                completion_text = "".join(
+                    p.decode() if isinstance(p, (bytes, bytearray)) else str(p) for p in parts
+                )
             
             agent_duration = time.time() - start_time
-            print(f"📊 Agent completed in {agent_duration:.2f}s. Extracted {len(traces)} traces")
+            log.info(_MSG_AGENT_DONE, agent_duration, len(traces))
             
-            # Submit traces to observability service
-            job_response = self.submit_traces_async(
-                input_text=input_text,
+            context = self._session_context(
+                params.agent_id, params.agent_alias_id, params.user_id, params.model_id, params.tags
+            )
+            fields = TraceFields(
+                input_text=params.input_text,
                 output_text=completion_text,
-                agent_id=agent_id,
-                agent_alias_id=agent_alias_id,
-                session_id=session_id,
-                user_id=user_id,
-                model_id=model_id,
-                tags=tags,
+                session_id=params.session_id,
                 traces=traces,
                 duration_ms=agent_duration * 1000,
-                streaming=streaming
+                streaming=params.streaming
             )
             
+            if batch:
+                # Defer submission to the batch buffer; the job entry arrives with the batch response
+                job_future = self.batch_buffer.add(context.encode(fields))
+                return {
+                    "completion": completion_text,
+                    "traces_count": len(traces),
+                    "agent_duration": agent_duration,
+                    "job_future": job_future,
+                    "status": "success"
+                }
+            
+            # Submit traces to observability service
+            job_response = self._submit_fields(context, fields)
+            
             result = {
                 "completion": completion_text,
                 "traces_count": len(traces),
@@ -122,18 +364,18 @@ class AsyncLangfuseObservabilityClient:
             
             # Wait for job completion if requested
             if wait_for_completion and job_response.get("job_id"):
-                print(f"⏳ Waiting for trace processing job {job_response['job_id']}...")
-                job_result = self.wait_for_job_completion(
+                log.info("⏳ Waiting for trace processing job %s...", job_response["job_id"])
+                job_result = self.wait_for_job(
                     job_response["job_id"],
-                    poll_interval=poll_interval,
-                    max_wait_time=max_wait_time
+                    max_wait_time=max_wait_time,
+                    retry_delay=poll_interval
                 )
                 result["observability"] = job_result
             
             return result
             
         except Exception as e:
-            print(f"❌ Error during agent invocation: {str(e)}")
+            log.error(_MSG_INVOKE_FAILED, e)
             return {
                 "error": str(e),
                 "status": "error"
@@ -146,7 +388,7 @@ class AsyncLangfuseObservabilityClient:
         agent_id: str,
         agent_alias_id: str,
         session_id: str,
-        traces: List[Dict[str, Any]],
+        traces: List[Any],
         user_id: str = "anonymous",
         model_id: str = None,
         tags: List[str] = None,
@@ -160,65 +402,170 @@ class AsyncLangfuseObservabilityClient:
         Returns:
             Response with job_id for tracking
         """
-        payload = {
+        # Agent fields are encoded once per configuration; only per-call fields are encoded here
+        context = self._session_context(agent_id, agent_alias_id, user_id, model_id, tags)
+        fields = TraceFields(
             # Input/Output data
-            "input_text": input_text,
-            "output_text": output_text,
-            "agent_id": agent_id,
-            "agent_alias_id": agent_alias_id,
-            "session_id": session_id,
-            "user_id": user_id,
-            "model_id": model_id,
-            "tags": tags or [],
+            input_text=input_text,
+            output_text=output_text,
+            session_id=session_id,
             
             # Trace data
-            "traces": traces,
+            traces=traces,
             
             # Optional metadata
-            "streaming": streaming,
-            "duration_ms": duration_ms
-        }
+            streaming=streaming,
+            duration_ms=duration_ms,
+            trace_id=trace_id
+        )
+        return self._submit_fields(context, fields)
+    
+    def _submit_fields(self, context: SessionContext, fields: TraceFields) -> Dict[str, Any]:
+        """Encode a payload from its session and per-call fields and submit it."""
+        payload = msgspec.Raw(context.encode(fields, msgpack=self.use_msgpack))
+        
+        try:
+            log.info(_MSG_SUBMITTING, len(fields.traces))
+            
+            response = self._post_payload(f"{self.service_url}/register-traces", payload)
+            
+            response.raise_for_status()
+            result = self._decode_response(response)
+            
+            log.info(_MSG_QUEUED, result.get("job_id"))
+            return result
+            
+        except _HTTP_ERRORS as e:
+            log.error(_MSG_SUBMIT_FAILED, e)
+            if hasattr(e, 'response') and e.response is not None and log.isEnabledFor(logging.DEBUG):
+                log.debug(_MSG_RESPONSE, e.response.text)
+            return {
+                "error": str(e),
+                "status": "failed"
+            }
+    
+    def submit_traces_batch(self, jobs: List[Any]) -> Dict[str, Any]:
+        """
+        Submit several trace payloads in a single request.
         
-        if trace_id:
-            payload["trace_id"] = trace_id
+        Args:
+            jobs: JSON payloads (as built by SessionContext.encode) wrapped in
+                msgspec.Raw
         
+        Returns:
+            Response with one job entry per submitted payload
+        """
         try:
-            print(f"📤 Submitting {len(traces)} traces for async processing...")
+            log.info(_MSG_BATCH_SUBMITTING, len(jobs))
             
-            response = self.session.post(
-                f"{self.service_url}/register-traces",
-                json=payload,
-                headers={"Content-Type": "application/json"},
-                timeout=30
+            # Buffered jobs are pre-encoded JSON, so the batch body is always JSON
+            response = self._post_payload(
+                f"{self.service_url}/register-traces-batch",
+                {"jobs": jobs},
+                allow_msgpack=False
             )
             
             response.raise_for_status()
-            result = response.json()
+            result = self._decode_response(response)
             
-            print(f"✅ Job queued successfully: {result['job_id']}")
+            log.info(_MSG_BATCH_QUEUED, len(result.get("jobs", [])))
             return result
             
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Failed to submit traces: {str(e)}")
-            if hasattr(e, 'response') and e.response:
-                print(f"   Response: {e.response.text}")
+        except _HTTP_ERRORS as e:
+            log.error(_MSG_BATCH_FAILED, e)
+            if hasattr(e, 'response') and e.response is not None and log.isEnabledFor(logging.DEBUG):
+                log.debug(_MSG_RESPONSE, e.response.text)
             return {
                 "error": str(e),
                 "status": "failed"
             }
     
-    def get_job_status(self, job_id: str) -> Dict[str, Any]:
-        """Get the current status of a processing job."""
+    def _session_context(
+        self,
+        agent_id: str,
+        agent_alias_id: str,
+        user_id: str = "anonymous",
+        model_id: str = None,
+        tags: List[str] = None
+    ) -> SessionContext:
+        """Return the cached pre-encoded agent fields for this configuration."""
+        key = (agent_id, agent_alias_id, user_id, model_id, tuple(tags) if tags else ())
+        context = self._session_contexts.get(key)
+        if context is None:
+            context = SessionContext.from_fields(AgentFields(
+                agent_id=agent_id,
+                agent_alias_id=agent_alias_id,
+                user_id=user_id,
+                model_id=model_id,
+                tags=list(key[4])
+            ))
+            self._session_contexts[key] = context
+        return context
+    
+    def _post_payload(
+        self,
+        url: str,
+        payload: Any,
+        allow_msgpack: bool = True
+    ) -> Any:
+        """
+        Encode and POST a payload, bypassing requests' stdlib json encoding.
+        
+        The body is msgpack when enabled on the client (and allowed for this
+        call), otherwise JSON; large bodies are gzip-compressed. msgspec.Raw
+        payloads are sent verbatim and must already be in that format.
+        """
+        if self.use_msgpack and allow_msgpack:
+            headers = {"Content-Type": MSGPACK_CONTENT_TYPE, "Accept": MSGPACK_CONTENT_TYPE}
+            body = _MSGPACK_ENCODER.encode(payload)
+        else:
+            headers = {"Content-Type": "application/json"}
+            body = _JSON_ENCODER.encode(payload)
+        
+        body = self._compress(body, headers)
+        return self._request("POST", url, data=body, headers=headers, timeout=30)
+    
+    def _request(self, method: str, url: str, data: bytes = None, **kwargs) -> Any:
+        """Send a request over the HTTP/2 client when available, else the requests session."""
+        if self.http is not None:
+            return self.http.request(method, url, content=data, **kwargs)
+        return self.session.request(method, url, data=data, **kwargs)
+    
+    def _compress(self, body: bytes, headers: Dict[str, str]) -> bytes:
+        """Gzip large request bodies, adding the Content-Encoding header when applied."""
+        if len(body) < GZIP_MIN_BYTES:
+            return body
+        headers["Content-Encoding"] = "gzip"
+        return gzip.compress(body, compresslevel=1)
+    
+    def _decode_response(self, response: Any) -> Dict[str, Any]:
+        """Decode a service response: msgpack if the service negotiated it, otherwise JSON."""
+        if response.headers.get("Content-Type", "").startswith(MSGPACK_CONTENT_TYPE):
+            return msgspec.msgpack.decode(response.content)
+        return orjson.loads(response.content)
+    
+    def get_job_status(self, job_id: str, wait: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Get the current status of a processing job.
+        
+        Args:
+            job_id: The job ID to check
+            wait: Seconds the service may hold the request open waiting for
+                the job to finish (long-poll); None returns immediately
+        """
+        params = {"wait": wait} if wait else None
         try:
-            response = self.session.get(
+            response = self._request(
+                "GET",
                 f"{self.service_url}/job-status/{job_id}",
-                timeout=10
+                params=params,
+                timeout=10 + (wait or 0)
             )
             response.raise_for_status()
-            return response.json()
+            return self._decode_response(response)
             
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Failed to get job status: {str(e)}")
+        except _HTTP_ERRORS as e:
+            log.error("❌ Failed to get job status: %s", e)
             return {
                 "error": str(e),
                 "status": "unknown"
@@ -227,7 +574,8 @@ class AsyncLangfuseObservabilityClient:
     def get_job_result(self, job_id: str) -> Optional[Dict[str, Any]]:
         """Get the result of a completed job."""
         try:
-            response = self.session.get(
+            response = self._request(
+                "GET",
                 f"{self.service_url}/job-result/{job_id}",
                 timeout=10
             )
@@ -237,15 +585,73 @@ class AsyncLangfuseObservabilityClient:
                 return None
             
             response.raise_for_status()
-            return response.json()
+            return self._decode_response(response)
             
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Failed to get job result: {str(e)}")
+        except _HTTP_ERRORS as e:
+            log.error("❌ Failed to get job result: %s", e)
             return {
                 "error": str(e),
                 "status": "failed"
             }
     
+    def wait_for_job(
+        self,
+        job_id: str,
+        max_wait_time: int = 300,
+        retry_delay: float = 2
+    ) -> Dict[str, Any]:
+        """
+        Wait for job completion with the service-side /job-wait long-poll.
+        
+        Each request is held open by the service for up to 25 seconds and is
+        repeated only while the service answers 202.
+        
+        Args:
+            job_id: The job ID to wait for
+            max_wait_time: Maximum seconds to wait
+            retry_delay: Seconds to pause before repeating when the 202
+                response carries no Retry-After header
+            
+        Returns:
+            Final job result, failure details, or timeout error
+        """
+        deadline = time.monotonic() + max_wait_time
+        
+        while (remaining := deadline - time.monotonic()) > 0:
+            timeout = min(remaining, 25)
+            try:
+                response = self._request(
+                    "GET",
+                    f"{self.service_url}/job-wait/{job_id}",
+                    params={"timeout": timeout},
+                    timeout=timeout + 10
+                )
+                if response.status_code != 202:
+                    response.raise_for_status()
+                    result = self._decode_response(response)
+                    if result.get("status") == "failed":
+                        log.error("❌ Job %s failed: %s", job_id, result.get("error"))
+                    else:
+                        log.info("✅ Job %s completed successfully!", job_id)
+                    return result
+                
+            except _HTTP_ERRORS as e:
+                log.error("❌ Failed to wait for job: %s", e)
+                return {
+                    "error": str(e),
+                    "status": "unknown"
+                }
+            
+            log.debug("⏳ Job %s still running", job_id)
+            time.sleep(float(response.headers.get("Retry-After", retry_delay)))
+        
+        # Timeout
+        log.warning("⏰ Job %s timed out after %s seconds", job_id, max_wait_time)
+        return {
+            "status": "timeout",
+            "error": f"Job did not complete within {max_wait_time} seconds"
+        }
+    
     def wait_for_job_completion(
         self, 
         job_id: str, 
@@ -253,49 +659,83 @@ class AsyncLangfuseObservabilityClient:
         max_wait_time: int = 300
     ) -> Dict[str, Any]:
         """
-        Wait for job completion by polling status.
+        Wait for job completion by polling status (for services without /job-wait).
+        
+        The delay between polls starts at poll_interval and grows by 1.5x up to
+        10 seconds. With long_poll enabled each status request is also held open
+        by the service for up to 10 seconds.
         
         Args:
             job_id: The job ID to monitor
-            poll_interval: Seconds between status checks
+            poll_interval: Initial seconds between status checks
             max_wait_time: Maximum seconds to wait
             
         Returns:
             Final job result or timeout error
         """
         start_time = time.time()
+        delay = poll_interval
+        wait = 10 if self.long_poll else None
         
         while time.time() - start_time < max_wait_time:
-            status = self.get_job_status(job_id)
+            status = self.get_job_status(job_id, wait=wait)
             
             if status.get("status") == "completed":
                 result = self.get_job_result(job_id)
                 if result:
-                    print(f"✅ Job {job_id} completed successfully!")
+                    log.info("✅ Job %s completed successfully!", job_id)
                     return result
             
             elif status.get("status") == "failed":
-                print(f"❌ Job {job_id} failed: {status.get('error')}")
+                log.error("❌ Job %s failed: %s", job_id, status.get("error"))
                 return status
             
             elif status.get("status") in ["pending", "processing"]:
-                print(f"⏳ Job {job_id} status: {status.get('status')}")
-                time.sleep(poll_interval)
+                log.debug("⏳ Job %s status: %s", job_id, status.get("status"))
             
             else:
-                print(f"❓ Unknown job status: {status}")
-                time.sleep(poll_interval)
+                log.warning("❓ Unknown job status: %s", status)
+            
+            time.sleep(delay)
+            delay = min(delay * 1.5, 10)
         
         # Timeout
-        print(f"⏰ Job {job_id} timed out after {max_wait_time} seconds")
+        log.warning("⏰ Job %s timed out after %s seconds", job_id, max_wait_time)
         return {
             "status": "timeout",
             "error": f"Job did not complete within {max_wait_time} seconds"
         }
+    
+    def close(self) -> None:
+        """
+        Send any buffered batch and release the client's HTTP/2 connections.
+        
+        Waits for batches still being sent (including ones flushed by the
+        buffer's timer) so their job entries are delivered before the
+        connections close. The requests session is shared (or owned by the
+        caller) and stays open.
+        """
+        self.batch_buffer.close()
+        if self.http is not None:
+            self.http.close()
+    
+    def __enter__(self) -> "AsyncLangfuseObservabilityClient":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+    
+    async def __aenter__(self) -> "AsyncLangfuseObservabilityClient":
+        return self
+    
+    async def __aexit__(self, *exc_info) -> None:
+        # close() makes blocking HTTP calls; keep them off the event loop
+        await asyncio.to_thread(self.close)
 
 
 def main():
     """Example usage of the Async Langfuse Observability Client."""
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     
     # Agent configuration
     agent_config = {
@@ -318,7 +758,7 @@ def main():
         input_text="What's the weather like today?",
         **agent_config,
         wait_for_completion=True,  # Wait for trace processing
-        poll_interval=2,  # Check status every 2 seconds
+        poll_interval=2,  # Pause between waits if the service sends no Retry-After
         max_wait_time=120  # Wait up to 2 minutes
     )
     
@@ -350,6 +790,8 @@ def main():
         print(f"📋 Job ID: {result2['job_id']}")
         print(f"🤖 Agent Response: {result2['completion']}")
         print("💡 Check job status later with client.get_job_status(job_id)")
+    
+    client.close()
 
 
 if __name__ == "__main__":
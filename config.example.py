@@ -23,7 +23,8 @@ AGENT_CONFIG = {
 SERVICE_CONFIG = {
     "host": "0.0.0.0",
     "port": 8000,
-    "log_level": "INFO"  # DEBUG, INFO, WARNING, ERROR
+    "log_level": "INFO",  # DEBUG, INFO, WARNING, ERROR
+    "web_concurrency": 4  # Uvicorn worker processes (WEB_CONCURRENCY env var); RELOAD=true forces 1
 }
 
 # Default tags for all traces
@@ -3,12 +3,257 @@ Example showing how to use the dockerized Langfuse trace registration service.
 This client sends input + output + traces to the service without any Langfuse configuration.
 """
 
+import hashlib
+import importlib.util
 import json
+import os
+import queue
+import random
+import secrets
+import sys
+import threading
 import boto3
-import requests
+import httpx
+import msgspec
+import orjson
 import time
+import zstandard
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from functools import lru_cache
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Set, Tuple, Union
+
+from schemas import TracePayload
+
+# Pooled keep-alive client shared by every call; HTTP/2 when the h2 package is installed.
+# The transport retries failed connection attempts before a request is sent.
+_HTTP = httpx.Client(
+    timeout=30,
+    transport=httpx.HTTPTransport(
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+        http2=importlib.util.find_spec("h2") is not None,
+        retries=3
+    )
+)
+
+
+# Fraction of routine trace events to send; failures and guardrail interventions are always sent
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+
+
+def _should_keep(trace: Dict[str, Any]) -> bool:
+    """Keep every diagnostic trace event and a TRACE_SAMPLE_RATE share of the rest."""
+    content = trace.get("trace") or {}
+    if "failureTrace" in content:
+        return True
+    guardrail = content.get("guardrailTrace")
+    if guardrail is not None and guardrail.get("action", "NONE") != "NONE":
+        return True
+    return random.random() < TRACE_SAMPLE_RATE
+
+
+@lru_cache(maxsize=None)
+def _register_endpoint(service_url: str) -> str:
+    """Return the /register-traces URL for a service, built once per service URL."""
+    return f"{service_url.rstrip('/')}/register-traces"
+
+
+_JSON_ENCODER = msgspec.json.Encoder()
+
+# Trace payloads are repetitive JSON and compress well; the service decodes zstd request bodies.
+# Compressors are not safe for concurrent use, so each upload thread gets its own.
+_zstd_local = threading.local()
+
+
+def _compress(body: bytes) -> bytes:
+    cctx = getattr(_zstd_local, "cctx", None)
+    if cctx is None:
+        cctx = _zstd_local.cctx = zstandard.ZstdCompressor(level=3)
+    return cctx.compress(body)
+
+
+def _dumps(obj: Any) -> bytes:
+    """Serialize a request body (TracePayload structs included) with msgspec."""
+    return _JSON_ENCODER.encode(obj)
+
+
+def _loads(data: bytes) -> Any:
+    """Deserialize a response body with orjson."""
+    return orjson.loads(data)
+
+
+class TraceBatcher:
+    """
+    Coalesces trace payloads from many callers into /register-traces-batch requests.
+    
+    A background thread sends a batch once it holds max_batch payloads or the
+    oldest payload has waited max_latency_ms.
+    """
+    
+    def __init__(self, service_url: str, max_batch: int = 64, max_latency_ms: int = 200):
+        self.endpoint = f"{service_url.rstrip('/')}/register-traces-batch"
+        self.max_batch = max_batch
+        self.max_latency_ms = max_latency_ms
+        self._queue: "queue.Queue[Optional[Tuple[TracePayload, Future]]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="trace-batcher", daemon=True)
+        self._thread.start()
+    
+    def submit(self, payload: TracePayload) -> Future:
+        """Queue a payload; the future resolves to its entry of the batch response."""
+        future = Future()
+        self._queue.put((payload, future))
+        return future
+    
+    def close(self) -> None:
+        """Send any queued payloads and stop the background thread."""
+        self._queue.put(None)
+        self._thread.join()
+    
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            
+            batch = [item]
+            deadline = time.monotonic() + self.max_latency_ms / 1000
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._send(batch)
+                    return
+                batch.append(item)
+            
+            self._send(batch)
+    
+    def _send(self, batch: List[Tuple[TracePayload, Future]]):
+        try:
+            response = _HTTP.post(
+                self.endpoint,
+                content=_compress(_dumps({"jobs": [payload for payload, _ in batch]})),
+                headers={"Content-Type": "application/json", "Content-Encoding": "zstd"}
+            )
+            response.raise_for_status()
+            jobs = _loads(response.content)["jobs"]
+            if len(jobs) != len(batch):
+                raise ValueError(f"Expected {len(batch)} job entries, got {len(jobs)}")
+            
+            print(f"✅ Registered batch of {len(batch)} trace payloads")
+            for (_, future), job in zip(batch, jobs):
+                future.set_result(job)
+        
+        except httpx.HTTPError as e:
+            print(f"❌ Failed to register trace batch: {str(e)}")
+            for _, future in batch:
+                future.set_result({
+                    "error": str(e),
+                    "status": "failed"
+                })
+        
+        except Exception as e:
+            # Anything else (bad response body, encoding error) must not kill the
+            # batcher thread or leave callers waiting on their futures
+            print(f"❌ Failed to register trace batch: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+
+# Uploads run here so callers are not blocked on the service round-trip
+_TRACE_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="trace-upload")
+# Uploads still in flight, so flush_traces() can wait for them
+_PENDING_UPLOADS: Set[Future] = set()
+
+
+# Responses to recently sent payloads, keyed by a hash of everything but the generated
+# trace_id, so re-sends of the same interaction are skipped
+_RESPONSE_CACHE: Dict[bytes, Tuple[float, Dict[str, Any]]] = {}
+_RESPONSE_CACHE_TTL = 300
+_RESPONSE_CACHE_MAX = 1024
+_response_cache_lock = threading.Lock()
+
+
+def _cached_response(digest: bytes) -> Optional[Dict[str, Any]]:
+    with _response_cache_lock:
+        entry = _RESPONSE_CACHE.get(digest)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] >= _RESPONSE_CACHE_TTL:
+            del _RESPONSE_CACHE[digest]
+            return None
+        return entry[1]
+
+
+def _cache_response(digest: bytes, result: Dict[str, Any]) -> None:
+    with _response_cache_lock:
+        _RESPONSE_CACHE.pop(digest, None)
+        if len(_RESPONSE_CACHE) >= _RESPONSE_CACHE_MAX:
+            # Dicts keep insertion order, so the first key is the oldest entry
+            del _RESPONSE_CACHE[next(iter(_RESPONSE_CACHE))]
+        _RESPONSE_CACHE[digest] = (time.monotonic(), result)
+
+
+def _do_post(url: str, body: bytes, dedup_body: bytes, attempts: int = 3) -> Dict[str, Any]:
+    """
+    POST a pre-encoded payload, retrying transport errors and 5xx with exponential backoff.
+    
+    dedup_body is the same payload without its per-call trace_id; it keys the response cache.
+    """
+    digest = hashlib.blake2b(url.encode() + dedup_body, digest_size=16).digest()
+    if (cached := _cached_response(digest)) is not None:
+        print("♻️  Identical traces already registered; reusing the earlier response")
+        return cached
+    
+    body = _compress(body)
+    headers = {"Content-Type": "application/json", "Content-Encoding": "zstd"}
+    for attempt in range(attempts):
+        try:
+            response = _HTTP.post(url, content=body, headers=headers)
+            response.raise_for_status()
+            result = _loads(response.content)
+            _cache_response(digest, result)
+            
+            print(f"✅ Traces registered successfully!")
+            print(f"   Status: {result.get('status')}")
+            print(f"   Trace ID: {result.get('trace_id')}")
+            
+            return result
+            
+        except httpx.HTTPError as e:
+            retryable = not isinstance(e, httpx.HTTPStatusError) or e.response.status_code >= 500
+            if retryable and attempt < attempts - 1:
+                time.sleep(0.5 * 2 ** attempt)
+                continue
+            
+            print(f"❌ Failed to register traces: {str(e)}")
+            if isinstance(e, httpx.HTTPStatusError):
+                print(f"   Response: {e.response.text}")
+            return {
+                "error": str(e),
+                "status": "failed"
+            }
+
+
+def flush_traces() -> None:
+    """Wait for all background uploads to finish; the upload pool stays usable."""
+    wait(list(_PENDING_UPLOADS))
+
+
+# One batcher per service endpoint, created on first batched registration
+_BATCHERS: Dict[str, TraceBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def _get_batcher(service_url: str) -> TraceBatcher:
+    with _batchers_lock:
+        batcher = _BATCHERS.get(service_url)
+        if batcher is None:
+            batcher = _BATCHERS[service_url] = TraceBatcher(service_url)
+        return batcher
+
 
 def register_traces_simple(
     # Input/Output data 
@@ -28,63 +273,67 @@ def register_traces_simple(
     duration_ms: float = None,
     
     # Service endpoint (deployed Docker container)
-    service_url: str = "http://localhost:8000"
-) -> Dict[str, Any]:
+    service_url: str = "http://localhost:8000",
+    
+    # Coalesce with other calls into a single batch request
+    batched: bool = False,
+    
+    # Return a Future immediately instead of waiting for the upload
+    background: bool = False
+) -> Union[Dict[str, Any], Future]:
     """
     Register traces with the dockerized service.
     No Langfuse configuration needed - it's configured at deployment time.
+    
+    With batched=True the payload is queued on a TraceBatcher and a Future is
+    returned instead; it resolves to the job entry once the batch is sent.
+    With background=True the upload runs on a worker thread and a Future
+    resolving to the service response is returned.
     """
     
-    payload = {
+    if TRACE_SAMPLE_RATE < 1.0:
+        traces = [t for t in traces if _should_keep(t)]
+    
+    payload = TracePayload(
         # Input/Output data
-        "input_text": input_text,
-        "output_text": output_text,
-        "agent_id": agent_id,
-        "agent_alias_id": agent_alias_id,
-        "session_id": session_id,
-        "user_id": user_id,
-        "model_id": model_id,
-        "tags": tags or [],
+        input_text=input_text,
+        output_text=output_text,
+        agent_id=agent_id,
+        agent_alias_id=agent_alias_id,
+        session_id=session_id,
+        user_id=user_id,
+        model_id=model_id,
+        tags=tags or [],
         
         # Trace data
-        "traces": traces,
+        traces=traces,
         
-        # Optional metadata
-        "trace_id": f"bedrock-{session_id}-{int(time.time())}",
-        "streaming": False,
-        "duration_ms": duration_ms
-    }
+        # Optional metadata (trace_id is added to the encoded body below)
+        streaming=False,
+        duration_ms=duration_ms,
+        sample_rate=TRACE_SAMPLE_RATE
+    )
     
-    try:
-        print(f"📤 Sending traces to service at {service_url}")
-        print(f"   Input: {input_text[:50]}...")
-        print(f"   Output: {output_text[:50]}...")
-        print(f"   Traces: {len(traces)} events")
-        
-        response = requests.post(
-            f"{service_url.rstrip('/')}/register-traces",
-            json=payload,
-            headers={"Content-Type": "application/json"},
-            timeout=30
-        )
-        
-        response.raise_for_status()
-        result = response.json()
-        
-        print(f"✅ Traces registered successfully!")
-        print(f"   Status: {result.get('status')}")
-        print(f"   Trace ID: {result.get('trace_id')}")
-        
-        return result
-        
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Failed to register traces: {str(e)}")
-        if hasattr(e, 'response') and e.response:
-            print(f"   Response: {e.response.text}")
-        return {
-            "error": str(e),
-            "status": "failed"
-        }
+    trace_id = f"bedrock-{session_id}-{int(time.time())}"
+    
+    if batched:
+        return _get_batcher(service_url).submit(msgspec.structs.replace(payload, trace_id=trace_id))
+    
+    print(f"📤 Sending traces to service at {service_url}")
+    print(f"   Input: {input_text[:50]}...")
+    print(f"   Output: {output_text[:50]}...")
+    print(f"   Traces: {len(traces)} events")
+    
+    # The generated trace_id differs on every call, so it is left out of the dedup key and
+    # spliced into the encoded object: "{...}" becomes "{...,"trace_id":...}"
+    dedup_body = _dumps(payload)
+    body = dedup_body[:-1] + b',"trace_id":' + _dumps(trace_id) + b"}"
+    
+    # Upload off the caller's thread, with retries
+    future = _TRACE_POOL.submit(_do_post, _register_endpoint(service_url), body, dedup_body)
+    _PENDING_UPLOADS.add(future)
+    future.add_done_callback(_PENDING_UPLOADS.discard)
+    return future if background else future.result()
 
 def example_bedrock_integration(
     service_url: str = "http://localhost:8000"
@@ -93,20 +342,24 @@ def example_bedrock_integration(
     Complete example showing how to integrate with existing Bedrock Agent code.
     """
     
+    # Progress lines are buffered and written with one call before the upload and one at the end
+    lines = []
+    _log = lines.append
+    
     # Your existing Bedrock Agent configuration
     agent_id = "YOUR_AGENT_ID" 
     agent_alias_id = "YOUR_AGENT_ALIAS_ID"
-    session_id = f"session-{int(time.time())}"
+    session_id = f"session-{secrets.token_hex(8)}"
     input_text = "What's the current weather in Seattle?"
     
-    print("🔬 Example: Bedrock Agent + Trace Registration Service")
-    print("=" * 60)
+    _log("🔬 Example: Bedrock Agent + Trace Registration Service\n")
+    _log("=" * 60 + "\n")
     
     try:
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
         
         # 1. Invoke Bedrock Agent (your existing code)
-        print("🚀 Step 1: Invoking Bedrock Agent...")
+        _log("🚀 Step 1: Invoking Bedrock Agent...\n")
         bedrock_client = boto3.client('bedrock-agent-runtime')
         
         response = bedrock_client.invoke_agent(
@@ -118,28 +371,33 @@ def example_bedrock_integration(
         )
         
         # 2. Extract output and traces (your existing code)
-        print("📊 Step 2: Extracting output and traces...")
-        output_text = ""
+        _log("📊 Step 2: Extracting output and traces...\n")
+        out_parts = []
         traces = []
+        out_append = out_parts.append
+        tr_append = traces.append
         
         for event in response['completion']:
             if 'chunk' in event:
                 chunk_data = event['chunk']
                 if 'bytes' in chunk_data:
-                    text = chunk_data['bytes'].decode('utf-8') if isinstance(chunk_data['bytes'], bytes) else str(chunk_data['bytes'])
-                    output_text += text
+                    # Bedrock always streams bytes; keep them raw and decode once after the stream ends
+                    out_append(chunk_data['bytes'])
             elif 'trace' in event:
-                traces.append(event['trace'])
+                tr_append(event['trace'])
+        
+        output_text = b"".join(out_parts).decode("utf-8")
         
-        end_time = time.time()
-        duration_ms = (end_time - start_time) * 1000
+        duration_ms = (time.perf_counter_ns() - start_ns) / 1_000_000
         
-        print(f"   Output: {len(output_text)} characters")
-        print(f"   Traces: {len(traces)} events")
-        print(f"   Duration: {duration_ms:.2f}ms")
+        _log(f"   Output: {len(output_text)} characters\n")
+        _log(f"   Traces: {len(traces)} events\n")
+        _log(f"   Duration: {duration_ms:.2f}ms\n")
         
         # 3. Send to trace registration service (NEW - just add this)
-        print("📤 Step 3: Registering traces in Langfuse...")
+        _log("📤 Step 3: Registering traces in Langfuse...\n")
+        sys.stdout.write("".join(lines))
+        lines.clear()
         result = register_traces_simple(
             input_text=input_text,
             output_text=output_text,
@@ -154,9 +412,9 @@ def example_bedrock_integration(
             service_url=service_url
         )
         
-        print("\n🎉 Complete flow successful!")
-        print(f"Agent Response: {output_text[:200]}...")
-        print(f"Traces Registered: {result.get('status') == 'success'}")
+        _log("\n🎉 Complete flow successful!\n")
+        _log(f"Agent Response: {output_text[:200]}...\n")
+        _log(f"Traces Registered: {result.get('status') == 'success'}\n")
         
         return {
             "agent_response": output_text,
@@ -166,11 +424,14 @@ def example_bedrock_integration(
         }
         
     except Exception as e:
-        print(f"❌ Error in example flow: {str(e)}")
+        _log(f"❌ Error in example flow: {str(e)}\n")
         return {
             "error": str(e),
             "status": "failed"
         }
+    
+    finally:
+        sys.stdout.write("".join(lines))
 
 def main():
     """Main example function."""
@@ -180,22 +441,28 @@ def main():
     # service_url = "http://your-k8s-service:8000"  # Kubernetes
     # service_url = "https://your-ecs-service.amazonaws.com"  # AWS ECS
     
-    # Check if service is healthy
     try:
-        health_response = requests.get(f"{service_url}/health", timeout=10)
-        if health_response.status_code == 200:
-            print(f"✅ Service is healthy at {service_url}")
-        else:
-            print(f"⚠️  Service health check failed: {health_response.status_code}")
+        # Check if service is healthy
+        try:
+            health_response = _HTTP.get(f"{service_url}/health", timeout=10)
+            if health_response.status_code == 200:
+                print(f"✅ Service is healthy at {service_url}")
+            else:
+                print(f"⚠️  Service health check failed: {health_response.status_code}")
+                return
+        except Exception as e:
+            print(f"❌ Cannot reach service at {service_url}: {str(e)}")
+            print("Make sure the Docker container is running:")
+            print("  docker-compose up -d")
             return
-    except Exception as e:
-        print(f"❌ Cannot reach service at {service_url}: {str(e)}")
-        print("Make sure the Docker container is running:")
-        print("  docker-compose up -d")
-        return
-    
-    # Run the example
-    example_bedrock_integration(service_url)
+        
+        # Run the example
+        example_bedrock_integration(service_url)
+    finally:
+        flush_traces()
+        for batcher in _BATCHERS.values():
+            batcher.close()
+        _HTTP.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -21,25 +21,44 @@ def main():
     port = int(os.getenv("PORT", 8000))
     log_level = os.getenv("LOG_LEVEL", "info").lower()
     reload = os.getenv("RELOAD", "false").lower() == "true"
+    # Reload mode only supports a single process
+    workers = 1 if reload else int(os.getenv("WEB_CONCURRENCY", "4"))
     
     print(f"🚀 Starting Langfuse Observability Service...")
     print(f"   Host: {host}")
     print(f"   Port: {port}")
     print(f"   Log Level: {log_level}")
     print(f"   Reload: {reload}")
+    print(f"   Workers: {workers}")
     print(f"   Access URL: http://{host}:{port}")
     print(f"   Health Check: http://{host}:{port}/health")
     print(f"   API Docs: http://{host}:{port}/docs")
     
-    # Run the FastAPI application
-    uvicorn.run(
-        "langfuse_observability.main:app",
+    # uvloop and httptools are not available on Windows; fall back to uvicorn's defaults there
+    native = sys.platform != "win32"
+    options = dict(
         host=host,
         port=port,
         log_level=log_level,
-        reload=reload,
+        loop="uvloop" if native else "auto",
+        http="httptools" if native else "auto",
+        interface="asgi3",
         access_log=True
     )
+    
+    if workers == 1 and not reload:
+        # Single process: import the app here and serve it directly, so module
+        # setup (settings, tracer provider) happens exactly once
+        from langfuse_observability.main import app
+        uvicorn.Server(uvicorn.Config(app, **options)).run()
+    else:
+        # Reload and multi-worker modes need an import string so each process can load the app
+        uvicorn.run(
+            "langfuse_observability.main:app",
+            reload=reload,
+            workers=workers,
+            **options
+        )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
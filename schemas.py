@@ -0,0 +1,109 @@
+"""
+Typed request payloads shared by the example clients.
+msgspec encodes these structs directly, without building an intermediate dict.
+"""
+
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+
+import msgspec
+
+_JSON_ENCODER = msgspec.json.Encoder()
+_MSGPACK_ENCODER = msgspec.msgpack.Encoder()
+
+
+@dataclass(slots=True, frozen=True)
+class InvokeParams:
+    """Parameters of one agent invocation, normalized once at the client API."""
+    input_text: str
+    agent_id: str
+    agent_alias_id: str
+    session_id: str
+    user_id: str = "anonymous"
+    model_id: Optional[str] = None
+    tags: Tuple[str, ...] = ()
+    streaming: bool = False
+
+
+class AgentFields(msgspec.Struct, omit_defaults=True):
+    """Agent configuration fields of a /register-traces payload.
+    
+    These repeat for every call made with the same agent configuration, so
+    they are encoded once per SessionContext. Fields left at their default
+    are omitted from the encoded payload; the service applies the same defaults.
+    """
+    agent_id: str
+    agent_alias_id: str
+    user_id: str = "anonymous"
+    model_id: Optional[str] = None
+    tags: List[str] = []
+
+
+class TraceFields(msgspec.Struct, omit_defaults=True):
+    """Per-call fields of a /register-traces payload."""
+    # Input/Output data
+    input_text: str
+    session_id: str
+    
+    # Trace data from Bedrock Agent
+    traces: List[Any]
+    
+    output_text: str = ""
+    
+    # Optional metadata
+    streaming: bool = False
+    duration_ms: Optional[float] = None
+    trace_id: Optional[str] = None
+
+
+class TracePayload(msgspec.Struct, omit_defaults=True):
+    """Complete /register-traces payload, for callers that send one-off requests.
+    
+    Fields left at their default are omitted from the encoded payload; the
+    service applies the same defaults.
+    """
+    # Input/Output data
+    input_text: str
+    agent_id: str
+    agent_alias_id: str
+    session_id: str
+    
+    # Trace data from Bedrock Agent
+    traces: List[Any]
+    
+    output_text: str = ""
+    user_id: str = "anonymous"
+    model_id: Optional[str] = None
+    tags: List[str] = []
+    
+    # Optional metadata
+    trace_id: Optional[str] = None
+    streaming: bool = False
+    duration_ms: Optional[float] = None
+    sample_rate: float = 1.0
+
+
+@dataclass(frozen=True)
+class SessionContext:
+    """Pre-encoded AgentFields, merged byte-wise with each call's TraceFields."""
+    json: bytes
+    msgpack: bytes
+    
+    @classmethod
+    def from_fields(cls, fields: AgentFields) -> "SessionContext":
+        return cls(
+            json=_JSON_ENCODER.encode(fields),
+            msgpack=_MSGPACK_ENCODER.encode(fields)
+        )
+    
+    def encode(self, fields: TraceFields, msgpack: bool = False) -> bytes:
+        """Encode a complete /register-traces payload as msgpack or JSON."""
+        if msgpack:
+            # Both maps have fewer than 16 keys, so each starts with a one-byte
+            # fixmap header (0x80 | size); the merged map does too
+            body = _MSGPACK_ENCODER.encode(fields)
+            size = (body[0] & 0x0F) + (self.msgpack[0] & 0x0F)
+            return bytes((0x80 | size,)) + body[1:] + self.msgpack[1:]
+        # Both objects are non-empty: join "{...}" and "{...}" as "{...,...}"
+        body = _JSON_ENCODER.encode(fields)
+        return body[:-1] + b"," + self.json[1:]
@@ -3,13 +3,32 @@ Simple client example for the Langfuse Trace Registration Service.
 This shows how to send input + output + traces to register in Langfuse.
 """
 
-import json
-import boto3
+import logging
+import threading
+import orjson
 import requests
 import time
+import zstandard
 from datetime import datetime
 from typing import List, Dict, Any
 
+from client_common import get_bedrock_client, get_default_session
+
+log = logging.getLogger(__name__)
+
+# Request bodies at least this large are zstd-compressed; the service decodes Content-Encoding: zstd.
+# Compressors are not safe for concurrent use, so each calling thread gets its own.
+ZSTD_MIN_BYTES = 1024
+_zstd_local = threading.local()
+
+
+def _compress(body: bytes) -> bytes:
+    cctx = getattr(_zstd_local, "cctx", None)
+    if cctx is None:
+        cctx = _zstd_local.cctx = zstandard.ZstdCompressor(level=3)
+    return cctx.compress(body)
+
+
 def register_agent_traces_in_langfuse(
     # Input data
     input_text: str,
@@ -89,30 +108,34 @@ def register_agent_traces_in_langfuse(
     }
     
     try:
-        print(f"📤 Registering traces for agent {agent_id}, session {session_id}")
-        print(f"   Input: {input_text[:100]}...")
-        print(f"   Output: {output_text[:100]}...")
-        print(f"   Traces: {len(traces)} trace events")
-        
-        response = requests.post(
-            f"{service_url.rstrip('/')}/register-traces",
-            json=payload,
-            headers={"Content-Type": "application/json"},
+        log.info("📤 Registering %d trace events for agent %s, session %s", len(traces), agent_id, session_id)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("   Input: %s...", input_text[:100])
+            log.debug("   Output: %s...", output_text[:100])
+        
+        url = f"{service_url.rstrip('/')}/register-traces"
+        body = orjson.dumps(payload, default=str)
+        headers = {"Content-Type": "application/json"}
+        if len(body) >= ZSTD_MIN_BYTES:
+            body = _compress(body)
+            headers["Content-Encoding"] = "zstd"
+        # Transient failures are retried by the shared session (see client_common.HTTP_RETRY)
+        response = get_default_session().post(
+            url,
+            data=body,
+            headers=headers,
             timeout=30
         )
         
         response.raise_for_status()
         result = response.json()
         
-        print(f"✅ Traces registered successfully in Langfuse!")
-        print(f"   Status: {result.get('status')}")
-        print(f"   Trace ID: {result.get('trace_id')}")
-        print(f"   Processed: {result.get('processed_traces')} traces")
+        log.info("✅ Traces registered: status=%s job_id=%s", result.get('status'), result.get('job_id'))
         
         return result
         
     except requests.exceptions.RequestException as e:
-        print(f"❌ Failed to register traces: {str(e)}")
+        log.error("❌ Failed to register traces: %s", e)
         return {
             "error": str(e),
             "status": "failed"
@@ -141,11 +164,11 @@ def invoke_bedrock_agent_and_register_traces(
     start_time = time.time()
     
     try:
-        # Create Bedrock client
-        bedrock_client = boto3.client('bedrock-agent-runtime')
+        # Reuse the process-wide Bedrock client
+        bedrock_client = get_bedrock_client()
         
         # Invoke the agent
-        print(f"🚀 Invoking Bedrock Agent {agent_id}...")
+        log.info("🚀 Invoking Bedrock Agent %s...", agent_id)
         response = bedrock_client.invoke_agent(
             inputText=input_text,
             agentId=agent_id,
@@ -155,27 +178,28 @@ def invoke_bedrock_agent_and_register_traces(
         )
         
         # Extract output and traces from response
-        output_text = ""
-        traces = []
+        output_chunks: List[str] = []
+        traces: List[Dict[str, Any]] = []
         
         for event in response['completion']:
-            # Collect text chunks
-            if 'chunk' in event:
-                chunk_data = event['chunk']
-                if 'bytes' in chunk_data:
-                    text = chunk_data['bytes'].decode('utf-8') if isinstance(chunk_data['bytes'], bytes) else str(chunk_data['bytes'])
-                    output_text += text
+            # Collect text chunks (Bedrock emits them as bytes; some chunks carry none)
+            if (chunk := event.get('chunk')) is not None:
+                if (chunk_bytes := chunk.get('bytes')) is not None:
+                    output_chunks.append(chunk_bytes.decode('utf-8'))
             
             # Collect trace events
-            elif 'trace' in event:
-                traces.append(event['trace'])
+            elif (trace := event.get('trace')) is not None:
+                traces.append(trace)
+        
+        output_text = "".join(output_chunks)
         
         end_time = time.time()
         duration_ms = (end_time - start_time) * 1000
         
-        print(f"✅ Agent invocation completed in {duration_ms:.2f}ms")
-        print(f"   Output: {len(output_text)} characters")
-        print(f"   Traces: {len(traces)} events")
+        log.info(
+            "✅ Agent invocation completed in %.2fms (%d characters, %d trace events)",
+            duration_ms, len(output_text), len(traces)
+        )
         
         # Register traces in Langfuse
         registration_result = register_agent_traces_in_langfuse(
@@ -202,7 +226,7 @@ def invoke_bedrock_agent_and_register_traces(
         }
         
     except Exception as e:
-        print(f"❌ Error during agent invocation: {str(e)}")
+        log.error("❌ Error during agent invocation: %s", e)
         return {
             "error": str(e),
             "status": "error"
@@ -211,6 +235,8 @@ def invoke_bedrock_agent_and_register_traces(
 def main():
     """Example usage of the trace registration."""
     
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
     # Configuration - Replace with your actual values
     config = {
         "agent_id": "YOUR_AGENT_ID",
@@ -3,22 +3,35 @@ FastAPI service for queuing Bedrock Agent traces for Langfuse registration.
 This service now queues trace processing jobs instead of processing them synchronously.
 """
 
-import redis
+import asyncio
+import msgspec
+import orjson
+import time
 import uuid
 import sys
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import Dict, Any
+from typing import Annotated, Dict, Any, List, Optional
 
 # Add src to Python path for Docker
 src_path = Path(__file__).parent.parent.parent
 if str(src_path) not in sys.path:
     sys.path.insert(0, str(src_path))
 
-from fastapi import FastAPI, HTTPException
+from celery import states
+from fastapi import FastAPI, HTTPException, Query, Request
 from loguru import logger
+from redis import asyncio as aioredis
 
-from langfuse_observability.shared.models import TraceRegistrationRequest, JobResponse, JobStatus
+from langfuse_observability.shared.models import (
+    TraceRegistrationRequest,
+    TraceRegistrationBatchRequest,
+    JobResponse,
+    BatchJobResponse,
+    JobStatus,
+)
+from langfuse_observability.shared.middleware import RequestDecompressionMiddleware
+from langfuse_observability.shared.responses import ORJSONResponse
 from langfuse_observability.shared.settings import settings
 from langfuse_observability.worker.celery_app import celery_app
 
@@ -29,108 +42,295 @@ logger.add(sys.stdout, format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}"
 app = FastAPI(
     title="Langfuse Trace Registration Service", 
     version="2.0.0",
-    description="Queues Bedrock Agent trace processing jobs for async processing"
+    description="Queues Bedrock Agent trace processing jobs for async processing",
+    default_response_class=ORJSONResponse
 )
+app.add_middleware(RequestDecompressionMiddleware, max_body_size=settings.max_request_body_bytes)
 
 # Redis client for job status tracking
-redis_client = redis.from_url(settings.redis_url)
+redis_client = aioredis.from_url(settings.redis_url)
+
+
+async def _task_snapshot(job_id: str):
+    """Read a task's state, info and completion time without blocking the event loop.
+    
+    The Celery result backend client is synchronous, so the lookup runs in a
+    worker thread.
+    """
+    def snapshot():
+        task_result = celery_app.AsyncResult(job_id)
+        return task_result.state, task_result.info, task_result.date_done
+    
+    return await asyncio.to_thread(snapshot)
+
+
+def _created_at(value: Any) -> datetime:
+    """Parse a job's stored created_at: epoch milliseconds, or ISO text from older entries."""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+
+
+def _started_at(info: Any) -> Optional[datetime]:
+    """Parse the ISO start time a worker records in its task meta/result, if any."""
+    value = info.get("started_at") if hasattr(info, "get") else None
+    return datetime.fromisoformat(value) if value else None
+
+
+async def _check_published(published: Any, stored: Any, keys: List[str]) -> None:
+    """Raise if publishing a task or storing its job metadata failed.
+    
+    The two run concurrently, so metadata may have been written for a task
+    that was never queued. Such keys are deleted: Celery reports unknown task
+    ids as PENDING, and the job would otherwise look pending until it expired.
+    """
+    if isinstance(published, BaseException):
+        if not isinstance(stored, BaseException):
+            await redis_client.delete(*keys)
+        raise published
+    if isinstance(stored, BaseException):
+        raise stored
 
 
-@app.post("/register-traces", response_model=JobResponse)
-async def register_traces(request: TraceRegistrationRequest):
+class _TraceEnvelope(msgspec.Struct):
+    """Registration body as checked by the API; trace events stay undecoded.
+    
+    Field types mirror TraceRegistrationRequest so a body the worker would
+    reject gets a 422 here rather than a job that can only fail.
+    """
+    input_text: str
+    agent_id: str
+    agent_alias_id: str
+    session_id: str
+    traces: List[msgspec.Raw]
+    user_id: str = "anonymous"
+    model_id: Optional[str] = None
+    tags: List[str] = []
+    output_text: str = ""
+    trace_id: Optional[str] = None
+    streaming: bool = False
+    duration_ms: Optional[float] = None
+    sample_rate: Annotated[float, msgspec.Meta(ge=0, le=1)] = 1.0
+
+
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+
+# Lax decoding, like pydantic's, so e.g. numeric strings are accepted for number fields
+_ENVELOPE_DECODER = msgspec.json.Decoder(_TraceEnvelope, strict=False)
+_ENVELOPE_MSGPACK_DECODER = msgspec.msgpack.Decoder(_TraceEnvelope, strict=False)
+
+
+@app.post(
+    "/register-traces",
+    status_code=202,
+    response_model=None,
+    responses={202: {"model": JobResponse}},
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "application/json": {"schema": TraceRegistrationRequest.model_json_schema()},
+                MSGPACK_CONTENT_TYPE: {"schema": TraceRegistrationRequest.model_json_schema()}
+            },
+            "required": True
+        }
+    }
+)
+async def register_traces(http_request: Request):
     """
     Queue trace registration job for async processing.
     
     This endpoint receives trace data and queues it for processing by Celery workers.
-    Returns immediately with a job ID for status checking.
+    Returns immediately with a job ID for status checking. Only the envelope
+    fields are decoded here; the raw body is forwarded to the worker, which
+    validates the full TraceRegistrationRequest.
+    
+    Bodies sent as application/msgpack are accepted too. The worker consumes
+    JSON, so they are transcoded once the envelope has been checked.
     """
-    logger.info(f"📥 Queuing trace job for agent {request.agent_id}, session {request.session_id}")
+    raw_body = await http_request.body()
+    is_msgpack = http_request.headers.get("content-type", "").startswith(MSGPACK_CONTENT_TYPE)
+    try:
+        if is_msgpack:
+            request = _ENVELOPE_MSGPACK_DECODER.decode(raw_body)
+            raw_body = msgspec.json.encode(msgspec.msgpack.decode(raw_body))
+        else:
+            request = _ENVELOPE_DECODER.decode(raw_body)
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    logger.info("📥 Queuing trace job for agent {}, session {}", request.agent_id, request.session_id)
     
     try:
-        # Generate job ID
+        # Mint the job ID up front so the task and its metadata can be written concurrently
         job_id = str(uuid.uuid4())
         
-        # Queue the processing task
-        task = celery_app.send_task('process_traces', args=[request.model_dump()], queue='traces')
-        
-        # Store job metadata in Redis
         job_metadata = {
-            "job_id": task.id,
-            "original_job_id": job_id,
+            "job_id": job_id,
             "status": "pending",
-            "created_at": datetime.now(timezone.utc).isoformat(),
+            "created_at": int(time.time() * 1000),  # epoch milliseconds
             "agent_id": request.agent_id,
             "session_id": request.session_id,
             "traces_count": len(request.traces)
         }
         
-        # Store with expiration (24 hours)
-        import json
-        redis_client.setex(
-            f"job:{task.id}", 
-            86400,  # 24 hours
-            json.dumps(job_metadata)
+        # Queue the processing task and store its metadata (24h expiry) in parallel
+        published, stored = await asyncio.gather(
+            asyncio.to_thread(
+                celery_app.send_task,
+                'process_traces',
+                args=[raw_body],
+                queue='traces',
+                task_id=job_id
+            ),
+            redis_client.setex(
+                f"job:{job_id}", 
+                86400,  # 24 hours
+                orjson.dumps(job_metadata)
+            ),
+            return_exceptions=True
         )
+        await _check_published(published, stored, [f"job:{job_id}"])
         
-        logger.info(f"✅ Queued trace processing job {task.id}")
+        logger.info("✅ Queued trace processing job {}", job_id)
         
-        return JobResponse(
-            job_id=task.id,
-            status="pending",
-            message=f"Trace processing job queued successfully. {len(request.traces)} traces to process."
+        return ORJSONResponse(
+            status_code=202,
+            content={
+                "job_id": job_id,
+                "status": "pending",
+                "message": f"Trace processing job queued successfully. {len(request.traces)} traces to process.",
+                "created_at": datetime.fromtimestamp(job_metadata["created_at"] / 1000, tz=timezone.utc)
+            }
         )
         
     except Exception as e:
-        logger.error(f"❌ Failed to queue trace processing job: {str(e)}")
+        logger.error("❌ Failed to queue trace processing job: {}", e)
         raise HTTPException(status_code=500, detail=f"Failed to queue job: {str(e)}")
 
 
-@app.get("/job-status/{job_id}", response_model=JobStatus)
-async def get_job_status(job_id: str):
-    """Get the status of a trace processing job."""
+@app.post("/register-traces-batch", response_model=BatchJobResponse)
+async def register_traces_batch(batch: TraceRegistrationBatchRequest):
+    """
+    Queue several trace registration jobs from a single request.
+    
+    Each entry becomes its own job, but the whole batch is processed by a
+    single worker task that exports to Langfuse once. Job metadata is written
+    to Redis in one pipelined round-trip while the task is published.
+    """
+    logger.info("📥 Queuing batch of {} trace jobs", len(batch.jobs))
+    
+    try:
+        created_at = int(time.time() * 1000)  # epoch milliseconds
+        pipeline = redis_client.pipeline(transaction=False)
+        jobs = []
+        batch_jobs = []
+        
+        for request in batch.jobs:
+            job_id = str(uuid.uuid4())
+            batch_jobs.append((job_id, request.model_dump_json()))
+            job_metadata = {
+                "job_id": job_id,
+                "status": "pending",
+                "created_at": created_at,
+                "agent_id": request.agent_id,
+                "session_id": request.session_id,
+                "traces_count": len(request.traces)
+            }
+            pipeline.setex(f"job:{job_id}", 86400, orjson.dumps(job_metadata))
+            jobs.append(JobResponse(
+                job_id=job_id,
+                status="pending",
+                message=f"Trace processing job queued successfully. {len(request.traces)} traces to process."
+            ))
+        
+        published, stored = await asyncio.gather(
+            asyncio.to_thread(celery_app.send_task, 'process_traces_batch', args=[batch_jobs], queue='traces'),
+            pipeline.execute(),
+            return_exceptions=True
+        )
+        await _check_published(published, stored, [f"job:{job_id}" for job_id, _ in batch_jobs])
+        
+        logger.info("✅ Queued {} trace processing jobs", len(jobs))
+        
+        return BatchJobResponse(
+            jobs=jobs,
+            message=f"{len(jobs)} trace processing jobs queued successfully."
+        )
+        
+    except Exception as e:
+        logger.error("❌ Failed to queue trace processing batch: {}", e)
+        raise HTTPException(status_code=500, detail=f"Failed to queue batch: {str(e)}")
+
+
+@app.get("/job-status/{job_id}", response_model=None, responses={200: {"model": JobStatus}})
+async def get_job_status(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=30, description="Seconds to hold the request open until the job finishes")
+):
+    """
+    Get the status of a trace processing job.
+    
+    With `wait` set, the request long-polls: it returns as soon as the job
+    reaches a terminal state or once `wait` seconds have elapsed.
+    
+    The already-built JobStatus is rendered directly (unset fields omitted)
+    instead of going through response-model validation a second time.
+    """
     try:
         # Get job metadata from Redis
-        job_data = redis_client.get(f"job:{job_id}")
+        job_data = await redis_client.get(f"job:{job_id}")
         if not job_data:
             raise HTTPException(status_code=404, detail="Job not found")
         
         # Get task result from Celery
-        from langfuse_observability.worker.celery_app import celery_app
-        task_result = celery_app.AsyncResult(job_id)
+        state, info, date_done = await _task_snapshot(job_id)
+        
+        if wait:
+            deadline = time.monotonic() + wait
+            while state not in states.READY_STATES and time.monotonic() < deadline:
+                await asyncio.sleep(0.5)
+                state, info, date_done = await _task_snapshot(job_id)
         
         # Parse stored metadata
-        import json
-        metadata = json.loads(job_data) if isinstance(job_data, (str, bytes)) else job_data
+        metadata = orjson.loads(job_data)
         
         # Build status response
         status_response = JobStatus(
             job_id=job_id,
-            status=task_result.state.lower(),
-            created_at=datetime.fromisoformat(metadata["created_at"])
+            status=state.lower(),
+            created_at=_created_at(metadata["created_at"])
         )
         
-        # Add task-specific information based on state
-        if task_result.state == "PENDING":
+        # Add task-specific information based on state; timestamps come from
+        # the worker so repeated polls see the same values
+        if state == "PENDING":
             status_response.status = "pending"
-        elif task_result.state == "PROCESSING":
+        elif state == "PROCESSING":
             status_response.status = "processing"
-            status_response.started_at = datetime.now(timezone.utc)
-            if hasattr(task_result.info, 'get'):
-                status_response.progress = task_result.info.get('progress')
-        elif task_result.state == "SUCCESS":
+            status_response.started_at = _started_at(info)
+            if hasattr(info, 'get'):
+                status_response.progress = info.get('progress')
+        elif state == "SUCCESS":
             status_response.status = "completed"
-            status_response.completed_at = datetime.now(timezone.utc)
-            status_response.result = task_result.result
-        elif task_result.state == "FAILURE":
+            status_response.started_at = _started_at(info)
+            status_response.completed_at = date_done
+            status_response.result = info
+        elif state == "FAILURE":
             status_response.status = "failed"
-            status_response.error = str(task_result.info)
+            status_response.completed_at = date_done
+            status_response.error = str(info)
         
-        return status_response
+        # Terminal states no longer change, so short-lived caching is safe
+        headers = {"Cache-Control": "max-age=1"} if state in states.READY_STATES else None
+        return ORJSONResponse(
+            content=status_response.model_dump(mode="json", exclude_none=True),
+            headers=headers
+        )
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"❌ Error getting job status: {str(e)}")
+        logger.error("❌ Error getting job status: {}", e)
         raise HTTPException(status_code=500, detail=f"Error getting job status: {str(e)}")
 
 
@@ -139,58 +339,110 @@ async def get_job_result(job_id: str) -> Dict[str, Any]:
     """Get the result of a completed trace processing job."""
     try:
         # Get task result from Celery
-        from langfuse_observability.worker.celery_app import celery_app
-        task_result = celery_app.AsyncResult(job_id)
+        state, info, _ = await _task_snapshot(job_id)
         
-        if task_result.state == "PENDING":
+        if state == "PENDING":
             raise HTTPException(status_code=202, detail="Job is still pending")
-        elif task_result.state == "PROCESSING":
+        elif state == "PROCESSING":
             raise HTTPException(status_code=202, detail="Job is still processing")
-        elif task_result.state == "SUCCESS":
+        elif state == "SUCCESS":
             return {
                 "job_id": job_id,
                 "status": "completed",
-                "result": task_result.result
+                "result": info
             }
-        elif task_result.state == "FAILURE":
+        elif state == "FAILURE":
             raise HTTPException(
                 status_code=500, 
-                detail=f"Job failed: {str(task_result.info)}"
+                detail=f"Job failed: {str(info)}"
             )
         else:
             raise HTTPException(
                 status_code=500, 
-                detail=f"Unknown job state: {task_result.state}"
+                detail=f"Unknown job state: {state}"
             )
             
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"❌ Error getting job result: {str(e)}")
+        logger.error("❌ Error getting job result: {}", e)
         raise HTTPException(status_code=500, detail=f"Error getting job result: {str(e)}")
 
 
-@app.get("/health")
-async def health_check():
-    """Health check endpoint."""
+@app.get("/job-wait/{job_id}")
+async def wait_for_job(
+    job_id: str,
+    timeout: float = Query(25, gt=0, le=30, description="Seconds to wait for the job to finish")
+):
+    """
+    Wait for a trace processing job to finish and return its outcome.
+    
+    Returns 200 with the result (or error) once the job reaches a terminal
+    state, or 202 with a Retry-After header if it is still running when
+    `timeout` expires. Replaces polling /job-status and /job-result.
+    """
+    try:
+        if not await redis_client.exists(f"job:{job_id}"):
+            raise HTTPException(status_code=404, detail="Job not found")
+        
+        state, info, _ = await _task_snapshot(job_id)
+        deadline = time.monotonic() + timeout
+        while state not in states.READY_STATES and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+            state, info, _ = await _task_snapshot(job_id)
+        
+        if state == "SUCCESS":
+            return {
+                "job_id": job_id,
+                "status": "completed",
+                "result": info
+            }
+        elif state in states.PROPAGATE_STATES:
+            # FAILURE or REVOKED: both are terminal, so report them instead of asking the client to retry
+            return {
+                "job_id": job_id,
+                "status": "failed",
+                "error": str(info)
+            }
+        
+        return ORJSONResponse(
+            status_code=202,
+            content={"job_id": job_id, "status": state.lower()},
+            headers={"Retry-After": "1"}
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("❌ Error waiting for job: {}", e)
+        raise HTTPException(status_code=500, detail=f"Error waiting for job: {str(e)}")
+
+
+# Component probe results are reused for this many seconds
+_HEALTH_TTL = 2.0
+_health_cache: Dict[str, Any] = {"ts": 0.0, "value": None}
+_health_refresh: Optional[asyncio.Task] = None
+
+
+async def _probe_health() -> Dict[str, Any]:
+    """Probe Redis and the Celery workers and cache the combined status."""
     try:
         # Check Redis connection
-        redis_client.ping()
+        await redis_client.ping()
         redis_status = "healthy"
     except Exception:
         redis_status = "unhealthy"
     
-    # Check Celery worker health
+    # Check Celery worker health with a broadcast ping (nothing is enqueued)
     try:
-        worker_check = celery_app.send_task('health_check', queue='traces')
-        worker_result = worker_check.get(timeout=5)
-        worker_status = "healthy" if worker_result.get("status") == "healthy" else "unhealthy"
+        replies = await asyncio.to_thread(celery_app.control.ping, timeout=1)
+        worker_status = "healthy" if replies else "unhealthy"
     except Exception:
         worker_status = "unhealthy"
     
     overall_status = "healthy" if redis_status == "healthy" and worker_status == "healthy" else "degraded"
     
-    return {
+    value = {
         "status": overall_status,
         "service": "langfuse-observability-api",
         "components": {
@@ -198,6 +450,31 @@ async def health_check():
             "worker": worker_status
         }
     }
+    _health_cache.update(ts=time.monotonic(), value=value)
+    return value
+
+
+@app.get("/health")
+async def health_check():
+    """
+    Health check endpoint.
+    
+    Serves the cached probe result while it is fresh; once stale, the cached
+    value is returned and a single background refresh is started.
+    """
+    global _health_refresh
+    
+    value = _health_cache["value"]
+    if value is not None and time.monotonic() - _health_cache["ts"] < _HEALTH_TTL:
+        return value
+    
+    if _health_refresh is None or _health_refresh.done():
+        _health_refresh = asyncio.create_task(_probe_health())
+    
+    # Nothing cached yet: the first caller waits for the probe
+    if value is None:
+        return await asyncio.shield(_health_refresh)
+    return value
 
 
 @app.get("/")
@@ -209,8 +486,10 @@ async def root():
         "description": "Queues Bedrock Agent trace processing for async worker processing",
         "endpoints": {
             "register_traces": "/register-traces",
+            "register_traces_batch": "/register-traces-batch",
             "job_status": "/job-status/{job_id}",
             "job_result": "/job-result/{job_id}",
+            "job_wait": "/job-wait/{job_id}",
             "health": "/health",
             "docs": "/docs"
         },
@@ -223,5 +502,17 @@ async def root():
 
 
 if __name__ == "__main__":
+    import os
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # uvloop and httptools are not available on Windows; fall back to uvicorn's defaults there
+    native = sys.platform != "win32"
+    # Workers need an import string so each process loads its own app
+    uvicorn.run(
+        "langfuse_observability.api.main:app",
+        host=settings.host,
+        port=settings.port,
+        loop="uvloop" if native else "auto",
+        http="httptools" if native else "auto",
+        workers=int(os.getenv("WEB_CONCURRENCY", "4")),
+        log_level=settings.log_level.lower()
+    )
\ No newline at end of file
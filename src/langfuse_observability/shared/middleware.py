@@ -0,0 +1,135 @@
+"""ASGI middleware shared by the service applications."""
+
+import zlib
+from typing import Callable, Dict
+
+import zstandard
+from starlette.responses import PlainTextResponse
+
+
+class _BodyTooLarge(Exception):
+    """Raised when a request body grows past the configured limit while decoding."""
+
+
+def _gzip_decompress(body: bytes, limit: int) -> bytes:
+    """Decode a gzip body, stopping as soon as the output would exceed `limit` bytes."""
+    decompressor = zlib.decompressobj(wbits=31)
+    data = decompressor.decompress(body, limit + 1)
+    if len(data) > limit:
+        raise _BodyTooLarge
+    if not decompressor.eof:
+        raise ValueError("Truncated gzip body")
+    if decompressor.unused_data:
+        # Anything after the first member would otherwise be dropped silently
+        raise ValueError("Trailing data after gzip member")
+    return data
+
+
+def _zstd_decompress(body: bytes, limit: int) -> bytes:
+    """Decode a zstd body as a stream (frames may omit their content size), bounded by `limit`."""
+    reader = zstandard.ZstdDecompressor().stream_reader(body, read_across_frames=True)
+    data = bytearray()
+    while chunk := reader.read(65536):
+        data += chunk
+        if len(data) > limit:
+            raise _BodyTooLarge
+    return bytes(data)
+
+
+class RequestDecompressionMiddleware:
+    """Decompress request bodies sent with a supported Content-Encoding.
+    
+    Handlers see the decoded body and headers without Content-Encoding, so
+    clients can compress large trace payloads without any endpoint changes.
+    Bodies larger than `max_body_size` are rejected with 413, whether sent
+    uncompressed or compressed; compressed bodies are checked both as sent
+    and once decoded, so a small payload cannot expand without bound.
+    """
+    
+    def __init__(self, app, max_body_size: int = 10 * 1024 * 1024):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.decoders: Dict[bytes, Callable[[bytes, int], bytes]] = {
+            b"gzip": _gzip_decompress,
+            b"zstd": _zstd_decompress,
+        }
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        encoding = None
+        content_length = None
+        for name, value in scope["headers"]:
+            if name == b"content-encoding":
+                encoding = value.strip().lower()
+            elif name == b"content-length":
+                content_length = value
+        
+        decoder = None
+        if encoding is not None and encoding != b"identity":
+            decoder = self.decoders.get(encoding)
+            if decoder is None:
+                response = PlainTextResponse(
+                    f"Unsupported Content-Encoding: {encoding.decode('latin-1')}", status_code=415
+                )
+                await response(scope, receive, send)
+                return
+        
+        # Reject a declared oversized body without reading it
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_body_size:
+            await self._too_large(scope, receive, send)
+            return
+        
+        # Read the whole body (compressed or not) so its size is bounded before the app sees it
+        chunks = []
+        received = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunk = message.get("body", b"")
+            received += len(chunk)
+            if received > self.max_body_size:
+                await self._too_large(scope, receive, send)
+                return
+            chunks.append(chunk)
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+        
+        if decoder is not None:
+            try:
+                body = decoder(body, self.max_body_size)
+            except _BodyTooLarge:
+                await self._too_large(scope, receive, send)
+                return
+            except Exception:
+                response = PlainTextResponse("Malformed compressed request body", status_code=400)
+                await response(scope, receive, send)
+                return
+            
+            headers = [
+                (name, value) for name, value in scope["headers"]
+                if name not in (b"content-encoding", b"content-length")
+            ]
+            headers.append((b"content-length", str(len(body)).encode("latin-1")))
+            scope = dict(scope, headers=headers)
+        
+        body_sent = False
+        
+        async def receive_decoded():
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        
+        await self.app(scope, receive_decoded, send)
+    
+    async def _too_large(self, scope, receive, send):
+        response = PlainTextResponse(
+            f"Request body exceeds {self.max_body_size} bytes", status_code=413
+        )
+        await response(scope, receive, send)
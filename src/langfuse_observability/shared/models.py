@@ -2,11 +2,13 @@
 
 from datetime import datetime, timezone
 from typing import Dict, Any, Optional, List
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class TraceRegistrationRequest(BaseModel):
     """Request model for trace registration."""
+    model_config = ConfigDict(extra="ignore")
+    
     # Input data (what was sent to the agent)
     input_text: str
     agent_id: str
@@ -19,13 +21,20 @@ class TraceRegistrationRequest(BaseModel):
     # Output data (what came back from the agent)
     output_text: str = ""
     
-    # Trace data from Bedrock Agent
-    traces: List[Dict[str, Any]]
+    # Trace data from Bedrock Agent (events are passed through without per-item validation)
+    traces: list
     
     # Optional metadata
     trace_id: Optional[str] = None
     streaming: bool = False
     duration_ms: Optional[float] = None
+    # Fraction of routine trace events the client kept (1.0 = unsampled)
+    sample_rate: float = Field(default=1.0, ge=0, le=1)
+
+
+class TraceRegistrationBatchRequest(BaseModel):
+    """Request model for registering several agent interactions at once."""
+    jobs: List[TraceRegistrationRequest]
 
 
 class JobResponse(BaseModel):
@@ -36,6 +45,12 @@ class JobResponse(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
+class BatchJobResponse(BaseModel):
+    """Response model for batch job creation."""
+    jobs: List[JobResponse]
+    message: str = "Jobs queued for processing"
+
+
 class JobStatus(BaseModel):
     """Job status model."""
     job_id: str
@@ -0,0 +1,18 @@
+"""Response classes shared by the service applications."""
+
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson instead of the stdlib encoder.
+    
+    Non-string dict keys are allowed, matching what handlers may return in
+    result payloads (e.g. per-type counts keyed by enum or int), and naive
+    datetimes are rendered as UTC.
+    """
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC)
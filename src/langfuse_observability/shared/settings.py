@@ -1,6 +1,6 @@
 """Shared settings configuration."""
 
-from typing import List
+from typing import List, Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -19,6 +19,8 @@ class Settings(BaseSettings):
     host: str = "0.0.0.0"
     port: int = 8000
     log_level: str = "INFO"
+    # Upper bound on a request body, before and after Content-Encoding is decoded
+    max_request_body_bytes: int = 10 * 1024 * 1024
     
     # Redis configuration
     redis_url: str = "redis://localhost:6379/0"
@@ -27,11 +29,27 @@ class Settings(BaseSettings):
     celery_broker_url: str = "redis://localhost:6379/0"
     celery_result_backend: str = "redis://localhost:6379/0"
     celery_task_track_started: bool = True
-    celery_task_serializer: str = "json"
-    celery_result_serializer: str = "json"
-    celery_accept_content: List[str] = ["json"]
+    # Internal worker traffic uses msgpack; JSON is still accepted for older producers
+    celery_task_serializer: str = "msgpack"
+    celery_result_serializer: str = "msgpack"
+    celery_accept_content: List[str] = ["msgpack", "json"]
     celery_timezone: str = "UTC"
     celery_enable_utc: bool = True
+    
+    # OpenTelemetry batch span processor tuning
+    bsp_max_queue_size: int = 4096
+    bsp_max_export_batch_size: int = 256
+    bsp_schedule_delay_millis: int = 1000
+    bsp_export_timeout_millis: int = 10000
+    
+    # OTLP transport: "http/protobuf" (what Langfuse serves) or "grpc" for gRPC-capable collectors
+    otlp_protocol: Literal["http/protobuf", "grpc"] = "http/protobuf"
+    
+    # Fraction of trace events whose raw Bedrock JSON is attached to their span as an event
+    # (0 disables it; each attached event roughly doubles that span's export size).
+    # Payloads above raw_trace_max_bytes are never attached.
+    raw_event_sample_rate: float = 0.0
+    raw_trace_max_bytes: int = 65536
 
 
 # Global settings instance
@@ -1,12 +1,15 @@
 """Trace registrar for handling Langfuse trace registration."""
 
 import json
+import orjson
+import random
 import time
 import base64
 import sys
 from pathlib import Path
-from datetime import datetime, timezone
-from typing import Dict, Any
+from urllib.parse import urlparse
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, NoReturn
 
 # Add src to Python path for Docker
 src_path = Path(__file__).parent.parent.parent
@@ -17,6 +20,7 @@ from fastapi import HTTPException
 from opentelemetry import trace
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.resources import Resource
+from opentelemetry.exporter.otlp.proto.http import Compression
 from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
 from opentelemetry.trace import Status, StatusCode, SpanKind
@@ -26,78 +30,150 @@ from langfuse_observability.shared.models import TraceRegistrationRequest
 from langfuse_observability.shared.settings import settings
 
 
+# Bound once at import; timestamps are taken several times per registration
+_UTC = timezone.utc
+_now = datetime.now
+_random = random.random
+
+# Built once per process from settings; shared by every tracer provider set up here
+_RESOURCE = Resource.create({
+    "service.name": "langfuse-trace-registration-service",
+    "deployment.environment": settings.environment,
+    "service.version": "1.0.0",
+    "service.namespace": "bedrock-agents"
+})
+_AUTH_HEADER = base64.b64encode(f"{settings.public_key}:{settings.secret_key}".encode()).decode()
+_OTLP_HEADERS = {"Authorization": f"Basic {_AUTH_HEADER}"}
+
+# Root span attributes that are the same for every registration
+_STATIC = {
+    sys.intern("gen_ai.operation.name"): sys.intern("agent"),
+    sys.intern("llm.system"): sys.intern("aws.bedrock"),
+    sys.intern("service.name"): sys.intern("langfuse-trace-registration-service"),
+}
+
+# Per-event span attribute keys, interned once since they are set for every trace event
+_K_INDEX = sys.intern("trace.index")
+_K_TYPE = sys.intern("trace.type")
+_K_EVENT_TIME = sys.intern("trace.event_time")
+_K_PROCESSED_AT = sys.intern("trace.processed_at")
+_K_RAW_DATA = sys.intern("trace.raw_data")
+
+# Read-only stand-in for absent nested objects, so lookups need no throwaway dict
+_EMPTY: Dict[str, Any] = {}
+
+
+def _raise_500(e: Exception) -> NoReturn:
+    """Raise a 500 for a failed registration, chaining the original exception."""
+    raise HTTPException(status_code=500, detail=f"Failed to register traces: {e}") from e
+
+
+def _dumps(obj: Any) -> str:
+    """Serialize a value to a JSON string for use as a span attribute."""
+    return _dumpb(obj).decode()
+
+
+def _dumpb(obj: Any) -> bytes:
+    """Serialize an arbitrary Bedrock payload to JSON; unknown types fall back to str()."""
+    try:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+    except orjson.JSONEncodeError:
+        # orjson rejects integers beyond 64 bits and very deep nesting; the stdlib encoder does not
+        return json.dumps(obj, default=str, ensure_ascii=False).encode()
+
+
 class TraceRegistrar:
     """Handles registering input/output with traces to Langfuse."""
     
     def __init__(self):
         self.tracer_provider = None
+        self.tracer = None
         self._setup_tracer_provider()
     
     def _setup_tracer_provider(self) -> None:
         """Set up OpenTelemetry tracer provider for Langfuse using global settings."""
         try:
-            # Create resource with service information
-            resource = Resource.create({
-                "service.name": "langfuse-trace-registration-service",
-                "deployment.environment": settings.environment,
-                "service.version": "1.0.0",
-                "service.namespace": "bedrock-agents"
-            })
-            
             # Create tracer provider
-            self.tracer_provider = TracerProvider(resource=resource)
-            
-            # Create auth header for Langfuse
-            auth_token = base64.b64encode(
-                f"{settings.public_key}:{settings.secret_key}".encode()
-            ).decode()
+            self.tracer_provider = TracerProvider(resource=_RESOURCE)
+            self.tracer = self.tracer_provider.get_tracer("bedrock-agent-trace-registrar")
             
             # Setup OTLP exporter for Langfuse
-            otlp_exporter = OTLPSpanExporter(
-                endpoint=f"{settings.api_url}/api/public/otel/v1/traces",
-                headers={"Authorization": f"Basic {auth_token}"},
-                timeout=30
-            )
+            if settings.otlp_protocol == "grpc":
+                # Imported lazily: the gRPC stack is only loaded when selected
+                from grpc import Compression as GRPCCompression
+                from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import (
+                    OTLPSpanExporter as GRPCSpanExporter,
+                )
+                
+                api_url = urlparse(settings.api_url)
+                insecure = api_url.scheme == "http"
+                otlp_exporter = GRPCSpanExporter(
+                    endpoint=f"{api_url.hostname}:{api_url.port or (80 if insecure else 443)}",
+                    insecure=insecure,
+                    headers=(("authorization", f"Basic {_AUTH_HEADER}"),),
+                    timeout=30,
+                    compression=GRPCCompression.Gzip
+                )
+            else:
+                otlp_exporter = OTLPSpanExporter(
+                    endpoint=f"{settings.api_url}/api/public/otel/v1/traces",
+                    headers=_OTLP_HEADERS,
+                    timeout=30,
+                    compression=Compression.Gzip
+                )
             
             # Add batch span processor
-            self.tracer_provider.add_span_processor(BatchSpanProcessor(otlp_exporter))
+            self.tracer_provider.add_span_processor(BatchSpanProcessor(
+                otlp_exporter,
+                max_queue_size=settings.bsp_max_queue_size,
+                max_export_batch_size=settings.bsp_max_export_batch_size,
+                schedule_delay_millis=settings.bsp_schedule_delay_millis,
+                export_timeout_millis=settings.bsp_export_timeout_millis
+            ))
             
-            logger.info(f"✅ Tracer provider configured for Langfuse at {settings.api_url}")
+            logger.info("✅ Tracer provider configured for Langfuse at {}", settings.api_url)
             
         except Exception as e:
-            logger.error(f"❌ Failed to setup tracer provider: {str(e)}")
+            logger.error("❌ Failed to setup tracer provider: {}", e)
             raise
     
     def register_traces(self, request: TraceRegistrationRequest) -> Dict[str, Any]:
-        """Register input/output with traces in Langfuse."""
+        """
+        Register input/output with traces in Langfuse.
+        
+        Spans are exported in the background by the batch span processor;
+        they are flushed when the tracer provider shuts down.
+        """
         try:
-            # Use the pre-configured tracer provider
-            tracer = self.tracer_provider.get_tracer("bedrock-agent-trace-registrar")
+            # Use the tracer created with the provider
+            tracer = self.tracer
             
             # Generate trace ID if not provided
             trace_id = request.trace_id or f"trace-{int(time.time())}"
             
             # Start root span for the complete agent interaction
-            start_time = datetime.now(timezone.utc)
+            # One wall-clock read; durations come from the monotonic clock
+            start_ns = time.monotonic_ns()
+            start_time = _now(_UTC)
+            start_iso = start_time.isoformat()
             
             with tracer.start_as_current_span(
                 name=f"Bedrock Agent: {request.agent_id}",
                 kind=SpanKind.CLIENT,
                 attributes={
-                    "gen_ai.operation.name": "agent",
+                    **_STATIC,
                     "agent.id": request.agent_id,
                     "agent.alias_id": request.agent_alias_id,
                     "session.id": request.session_id,
                     "user.id": request.user_id,
                     "custom.trace_id": trace_id,
-                    "tags": json.dumps(request.tags),
+                    "tags": _dumps(request.tags),
                     "stream_mode": request.streaming,
-                    "llm.system": "aws.bedrock",
                     "llm.request.model": request.model_id or "bedrock-agent-default",
                     "gen_ai.prompt": request.input_text,
                     "gen_ai.completion": request.output_text,
-                    "service.name": "langfuse-trace-registration-service",
-                    "trace.start_time": start_time.isoformat(),
+                    "trace.start_time": start_iso,
+                    "traces.sample_rate": request.sample_rate,
                 }
             ) as root_span:
                 
@@ -105,92 +181,101 @@ class TraceRegistrar:
                 if request.duration_ms:
                     root_span.set_attribute("trace.duration_ms", request.duration_ms)
                 
-                # Process each trace event
+                # Process each trace event; all events share one processing timestamp
+                processed_at = start_iso
                 processed_traces = []
+                failures: List[str] = []
                 for i, trace_data in enumerate(request.traces):
-                    try:
-                        processed_trace = self._process_single_trace(
-                            trace_data, root_span, tracer, i
-                        )
-                        processed_traces.append(processed_trace)
-                    except Exception as e:
-                        logger.error(f"Error processing trace {i}: {str(e)}")
-                        root_span.record_exception(e)
+                    if not isinstance(trace_data, dict):
+                        failures.append(f"trace {i}: expected an object")
+                        continue
+                    processed_traces.append(self._process_single_trace(
+                        trace_data, root_span, tracer, i, processed_at, failures
+                    ))
+                
+                if failures:
+                    logger.error("Failed to map {} of {} traces, first: {}", len(failures), len(request.traces), failures[0])
                 
                 # Set completion attributes on root span
-                end_time = datetime.now(timezone.utc)
-                duration_ms = (end_time - start_time).total_seconds() * 1000
+                duration_ms = (time.monotonic_ns() - start_ns) / 1e6
+                end_time = start_time + timedelta(milliseconds=duration_ms)
                 
                 root_span.set_attribute("trace.end_time", end_time.isoformat())
                 root_span.set_attribute("trace.duration_ms", duration_ms)
                 root_span.set_attribute("traces.count", len(processed_traces))
+                root_span.set_attribute("traces.failed", len(failures))
                 root_span.set_status(Status(StatusCode.OK))
             
-            # Force flush to ensure data is sent to Langfuse
-            success = self.tracer_provider.force_flush(timeout_millis=10000)
-            
             return {
                 "status": "success",
                 "trace_id": trace_id,
                 "processed_traces": len(processed_traces),
-                "flushed": success,
-                "message": "Traces successfully sent to Langfuse"
+                "message": "Traces queued for export to Langfuse"
             }
             
         except Exception as e:
-            logger.error(f"❌ Error registering traces: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Failed to register traces: {str(e)}")
+            logger.error("❌ Error registering traces: {}", e)
+            _raise_500(e)
+    
+    def register_many(self, requests: List[TraceRegistrationRequest]) -> List[Any]:
+        """
+        Register several interactions in one call.
+        
+        Returns one entry per request, in order: the result dictionary, or the
+        exception raised while registering that request.
+        """
+        results: List[Any] = []
+        for request in requests:
+            try:
+                results.append(self.register_traces(request))
+            except Exception as e:
+                results.append(e)
+        
+        return results
     
     def _process_single_trace(
         self, 
         trace_data: Dict[str, Any], 
         parent_span, 
         tracer, 
-        trace_index: int
+        trace_index: int,
+        processed_at: str,
+        failures: List[str]
     ) -> Dict[str, Any]:
-        """Process a single trace event and create appropriate spans."""
+        """
+        Process a single trace event and create appropriate spans.
+        
+        If the type-specific attributes cannot be extracted, the span is still
+        created and the error is appended to `failures`.
+        """
         
-        trace_content = trace_data.get("trace", {})
+        trace_content = trace_data.get("trace") or _EMPTY
         event_time = trace_data.get("eventTime")
         
         # Determine trace type and create appropriate span
         span_name = "unknown_trace"
         span_attributes = {
-            "trace.index": trace_index,
-            "trace.type": "unknown"
+            _K_INDEX: trace_index,
+            _K_TYPE: "unknown"
         }
         
         if event_time:
-            if isinstance(event_time, str):
-                span_attributes["trace.event_time"] = event_time
+            # Exact type check first: JSON-decoded payloads always carry plain str
+            if type(event_time) is str:
+                span_attributes[_K_EVENT_TIME] = event_time
             elif isinstance(event_time, datetime):
-                span_attributes["trace.event_time"] = event_time.isoformat()
+                span_attributes[_K_EVENT_TIME] = event_time.isoformat()
         
-        # Handle different trace types
-        if "orchestrationTrace" in trace_content:
-            span_name = "orchestrationTrace"
-            span_attributes["trace.type"] = "orchestration"
-            self._add_orchestration_attributes(trace_content["orchestrationTrace"], span_attributes)
-            
-        elif "preProcessingTrace" in trace_content:
-            span_name = "pre_processing"
-            span_attributes["trace.type"] = "preprocessing"
-            self._add_preprocessing_attributes(trace_content["preProcessingTrace"], span_attributes)
-            
-        elif "postProcessingTrace" in trace_content:
-            span_name = "postProcessingTrace"
-            span_attributes["trace.type"] = "postprocessing"
-            self._add_postprocessing_attributes(trace_content["postProcessingTrace"], span_attributes)
-            
-        elif "guardrailTrace" in trace_content:
-            span_name = "guardrail_trace"
-            span_attributes["trace.type"] = "guardrail"
-            self._add_guardrail_attributes(trace_content["guardrailTrace"], span_attributes)
-            
-        elif "failureTrace" in trace_content:
-            span_name = "failure_trace"
-            span_attributes["trace.type"] = "failure"
-            self._add_failure_attributes(trace_content["failureTrace"], span_attributes)
+        # Handle different trace types (each event carries exactly one trace key)
+        try:
+            for key, value in trace_content.items():
+                entry = _DISPATCH.get(key)
+                if entry is not None:
+                    span_name, span_attributes[_K_TYPE], add_attributes = entry
+                    add_attributes(self, value, span_attributes)
+                    break
+        except Exception as e:
+            failures.append(f"trace {trace_index}: {e}")
         
         # Create span for this trace
         with tracer.start_as_current_span(
@@ -200,57 +285,62 @@ class TraceRegistrar:
             context=trace.set_span_in_context(parent_span)
         ) as trace_span:
             
-            # Add the full trace data as an event
-            trace_span.add_event(
-                name="bedrock_trace_data",
-                attributes={
-                    "trace.raw_data": json.dumps(trace_data),
-                    "trace.processed_at": datetime.now(timezone.utc).isoformat()
-                }
-            )
+            # Attach the full trace data for a sampled fraction of events
+            if _random() < settings.raw_event_sample_rate:
+                raw_data = _dumpb(trace_data)
+                if len(raw_data) <= settings.raw_trace_max_bytes:
+                    trace_span.add_event(
+                        name="bedrock_trace_data",
+                        attributes={
+                            _K_RAW_DATA: raw_data.decode(),
+                            _K_PROCESSED_AT: processed_at
+                        }
+                    )
         
         return {
-            "type": span_attributes["trace.type"],
+            "type": span_attributes[_K_TYPE],
             "span_name": span_name,
             "processed": True
         }
     
     def _add_orchestration_attributes(self, orchestration_trace: Dict, attributes: Dict):
         """Add orchestration-specific attributes."""
-        if "modelInvocationInput" in orchestration_trace:
-            model_input = orchestration_trace["modelInvocationInput"]
+        model_input = orchestration_trace.get("modelInvocationInput")
+        if model_input is not None:
             attributes["llm.request.type"] = model_input.get("type", "unknown")
-            if "text" in model_input:
-                attributes["gen_ai.prompt"] = model_input["text"]
+            text = model_input.get("text")
+            if text is not None:
+                attributes["gen_ai.prompt"] = text
         
-        if "modelInvocationOutput" in orchestration_trace:
-            model_output = orchestration_trace["modelInvocationOutput"]
-            if "rawResponse" in model_output:
-                raw_response = model_output["rawResponse"]
-                if "content" in raw_response:
-                    attributes["gen_ai.completion"] = str(raw_response["content"])
-                if "usage" in raw_response:
-                    usage = raw_response["usage"]
-                    attributes["gen_ai.usage.prompt_tokens"] = usage.get("inputTokens", 0)
-                    attributes["gen_ai.usage.completion_tokens"] = usage.get("outputTokens", 0)
-                    attributes["gen_ai.usage.total_tokens"] = usage.get("inputTokens", 0) + usage.get("outputTokens", 0)
+        model_output = orchestration_trace.get("modelInvocationOutput") or _EMPTY
+        raw_response = model_output.get("rawResponse")
+        if raw_response is not None:
+            content = raw_response.get("content")
+            if content is not None:
+                # Usually already a string; anything else is encoded as JSON rather than repr()'d
+                attributes["gen_ai.completion"] = content if type(content) is str else _dumps(content)
+            usage = raw_response.get("usage")
+            if usage is not None:
+                input_tokens = usage.get("inputTokens", 0)
+                output_tokens = usage.get("outputTokens", 0)
+                attributes["gen_ai.usage.prompt_tokens"] = input_tokens
+                attributes["gen_ai.usage.completion_tokens"] = output_tokens
+                attributes["gen_ai.usage.total_tokens"] = input_tokens + output_tokens
     
     def _add_preprocessing_attributes(self, preprocessing_trace: Dict, attributes: Dict):
         """Add preprocessing-specific attributes."""
-        if "modelInvocationOutput" in preprocessing_trace:
-            model_output = preprocessing_trace["modelInvocationOutput"]
-            if "parsedResponse" in model_output:
-                parsed = model_output["parsedResponse"]
-                attributes["preprocessing.is_valid"] = parsed.get("isValid", False)
-                attributes["preprocessing.rationale"] = parsed.get("rationale", "")
+        model_output = preprocessing_trace.get("modelInvocationOutput") or _EMPTY
+        parsed = model_output.get("parsedResponse")
+        if parsed is not None:
+            attributes["preprocessing.is_valid"] = parsed.get("isValid", False)
+            attributes["preprocessing.rationale"] = parsed.get("rationale", "")
     
     def _add_postprocessing_attributes(self, postprocessing_trace: Dict, attributes: Dict):
         """Add postprocessing-specific attributes."""
-        if "modelInvocationOutput" in postprocessing_trace:
-            model_output = postprocessing_trace["modelInvocationOutput"]
-            if "parsedResponse" in model_output:
-                parsed = model_output["parsedResponse"]
-                attributes["postprocessing.text"] = parsed.get("text", "")
+        model_output = postprocessing_trace.get("modelInvocationOutput") or _EMPTY
+        parsed = model_output.get("parsedResponse")
+        if parsed is not None:
+            attributes["postprocessing.text"] = parsed.get("text", "")
     
     def _add_guardrail_attributes(self, guardrail_trace: Dict, attributes: Dict):
         """Add guardrail-specific attributes."""
@@ -258,10 +348,20 @@ class TraceRegistrar:
         attributes["guardrail.trace_id"] = guardrail_trace.get("traceId", "unknown")
         if "outputs" in guardrail_trace:
             outputs = guardrail_trace["outputs"]
-            if isinstance(outputs, list) and len(outputs) > 0:
-                attributes["guardrail.output"] = json.dumps(outputs[0])
+            if type(outputs) is list and outputs:
+                attributes["guardrail.output"] = _dumps(outputs[0])
     
     def _add_failure_attributes(self, failure_trace: Dict, attributes: Dict):
         """Add failure-specific attributes."""
         attributes["failure.trace_id"] = failure_trace.get("traceId", "unknown")
-        attributes["failure.failure_reason"] = failure_trace.get("failureReason", "unknown")
\ No newline at end of file
+        attributes["failure.failure_reason"] = failure_trace.get("failureReason", "unknown")
+
+
+# Bedrock trace key -> (span name, trace type, attribute handler)
+_DISPATCH = {
+    "orchestrationTrace": ("orchestrationTrace", "orchestration", TraceRegistrar._add_orchestration_attributes),
+    "preProcessingTrace": ("pre_processing", "preprocessing", TraceRegistrar._add_preprocessing_attributes),
+    "postProcessingTrace": ("postProcessingTrace", "postprocessing", TraceRegistrar._add_postprocessing_attributes),
+    "guardrailTrace": ("guardrail_trace", "guardrail", TraceRegistrar._add_guardrail_attributes),
+    "failureTrace": ("failure_trace", "failure", TraceRegistrar._add_failure_attributes),
+}
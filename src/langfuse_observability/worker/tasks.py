@@ -5,52 +5,88 @@ import time
 import sys
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple, Union
 
 # Add src to Python path for Docker
 src_path = Path(__file__).parent.parent.parent
 if str(src_path) not in sys.path:
     sys.path.insert(0, str(src_path))
 
-from celery import current_task
+from celery import current_task, states
+from celery.signals import worker_process_init, worker_process_shutdown
 from loguru import logger
+from pydantic import ValidationError
 
 from langfuse_observability.worker.celery_app import celery_app
 from langfuse_observability.shared.models import TraceRegistrationRequest
 from langfuse_observability.shared.trace_registrar import TraceRegistrar
 
+# One registrar (and tracer provider) per worker process, reused across tasks
+_registrar: Optional[TraceRegistrar] = None
+
+
+def _get_registrar() -> TraceRegistrar:
+    """Return this process's trace registrar, creating it on first use."""
+    global _registrar
+    if _registrar is None:
+        _registrar = TraceRegistrar()
+    return _registrar
+
+
+@worker_process_init.connect
+def _init_registrar(**kwargs) -> None:
+    """Build the registrar in each child process before it takes tasks."""
+    _get_registrar()
+
+
+@worker_process_shutdown.connect
+def _shutdown_registrar(**kwargs) -> None:
+    """Export any spans still buffered before the child process exits."""
+    if _registrar is not None:
+        _registrar.tracer_provider.shutdown()
+
 
 @celery_app.task(bind=True, name="process_traces")
-def process_traces(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
+def process_traces(self, request_data: Union[bytes, str, Dict[str, Any]]) -> Dict[str, Any]:
     """
     Process traces asynchronously.
     
     Args:
-        request_data: Dictionary containing trace registration request data
+        request_data: Trace registration request as JSON (bytes or str), or
+            as a dictionary from older producers
         
     Returns:
         Dictionary with processing results
     """
     job_id = self.request.id
-    logger.info(f"📥 Starting trace processing for job {job_id}")
+    logger.info("📥 Starting trace processing for job {}", job_id)
+    
+    try:
+        # Parse request data into Pydantic model
+        if isinstance(request_data, dict):
+            request = TraceRegistrationRequest(**request_data)
+        else:
+            request = TraceRegistrationRequest.model_validate_json(request_data)
+    except ValidationError as exc:
+        # An invalid request fails the same way on every attempt, so fail the job without retrying
+        logger.error("❌ Invalid trace request for job {}: {}", job_id, exc)
+        raise ValueError(f"Invalid trace request: {exc}") from exc
     
     try:
         # Update task state to processing
+        started_at = datetime.now(timezone.utc).isoformat()
         current_task.update_state(
             state="PROCESSING",
             meta={
                 "job_id": job_id,
                 "status": "processing",
-                "started_at": datetime.now(timezone.utc).isoformat(),
-                "progress": {"current": 0, "total": len(request_data.get("traces", []))}
+                "started_at": started_at,
+                "progress": {"current": 0, "total": len(request.traces)}
             }
         )
         
-        # Parse request data into Pydantic model
-        request = TraceRegistrationRequest(**request_data)
-        
-        # Create trace registrar instance
-        trace_registrar = TraceRegistrar()
+        # Reuse this process's trace registrar
+        trace_registrar = _get_registrar()
         
         # Process traces
         start_time = time.time()
@@ -61,15 +97,16 @@ def process_traces(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
         result.update({
             "job_id": job_id,
             "processing_time_seconds": processing_time,
+            "started_at": started_at,
             "completed_at": datetime.now(timezone.utc).isoformat()
         })
         
-        logger.info(f"✅ Completed trace processing for job {job_id} in {processing_time:.2f}s")
+        logger.info("✅ Completed trace processing for job {} in {:.2f}s", job_id, processing_time)
         return result
         
     except Exception as exc:
         error_msg = str(exc)
-        logger.error(f"❌ Error processing traces for job {job_id}: {error_msg}")
+        logger.error("❌ Error processing traces for job {}: {}", job_id, error_msg)
         
         # Update task state to failed
         current_task.update_state(
@@ -86,6 +123,86 @@ def process_traces(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
         raise self.retry(exc=exc, countdown=60, max_retries=3)
 
 
+@celery_app.task(bind=True, name="process_traces_batch")
+def process_traces_batch(self, jobs: List[Tuple[str, Union[bytes, str]]]) -> Dict[str, Any]:
+    """
+    Process several trace registration jobs in one task.
+    
+    Each entry is a (job_id, request JSON) pair. Every job's own result is
+    stored under its job_id so it can be polled like a regular
+    process_traces job.
+    
+    Args:
+        jobs: Job IDs paired with their trace registration request JSON
+        
+    Returns:
+        Dictionary with a summary of the batch
+    """
+    batch_id = self.request.id
+    logger.info("📥 Starting batch trace processing for {} jobs (batch {})", len(jobs), batch_id)
+    
+    start_time = time.time()
+    started_at = datetime.now(timezone.utc).isoformat()
+    job_ids = []
+    requests = []
+    
+    for job_id, request_data in jobs:
+        try:
+            request = TraceRegistrationRequest.model_validate_json(request_data)
+        except Exception as exc:
+            logger.error("❌ Invalid trace request for job {}: {}", job_id, exc)
+            self.backend.store_result(job_id, exc, states.FAILURE)
+            continue
+        
+        self.update_state(
+            task_id=job_id,
+            state="PROCESSING",
+            meta={
+                "job_id": job_id,
+                "status": "processing",
+                "started_at": started_at,
+                "progress": {"current": 0, "total": len(request.traces)}
+            }
+        )
+        job_ids.append(job_id)
+        requests.append(request)
+    
+    try:
+        results = _get_registrar().register_many(requests)
+    except Exception as exc:
+        # Don't leave the batch's jobs stuck in PROCESSING
+        logger.error("❌ Batch {} failed: {}", batch_id, exc)
+        for job_id in job_ids:
+            self.backend.store_result(job_id, exc, states.FAILURE)
+        raise
+    processing_time = time.time() - start_time
+    completed_at = datetime.now(timezone.utc).isoformat()
+    
+    failed = len(jobs) - len(job_ids)
+    for job_id, result in zip(job_ids, results):
+        if isinstance(result, Exception):
+            failed += 1
+            self.backend.store_result(job_id, result, states.FAILURE)
+            continue
+        
+        result.update({
+            "job_id": job_id,
+            "batch_id": batch_id,
+            "processing_time_seconds": processing_time,
+            "started_at": started_at,
+            "completed_at": completed_at
+        })
+        self.backend.store_result(job_id, result, states.SUCCESS)
+    
+    logger.info("✅ Completed batch {}: {} succeeded, {} failed in {:.2f}s", batch_id, len(jobs) - failed, failed, processing_time)
+    return {
+        "batch_id": batch_id,
+        "jobs": len(jobs),
+        "failed": failed,
+        "processing_time_seconds": processing_time
+    }
+
+
 @celery_app.task(name="health_check")
 def health_check() -> Dict[str, Any]:
     """Health check task for worker monitoring."""